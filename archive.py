@@ -0,0 +1,304 @@
+"""
+Archive of finished documents in year/month partitions
+
+archive_artifacts() moves catalogued PDFs and JPGs out of the repo root and
+output/ into archive/<year>/<month>/ by document date, so the working
+directories stay small. pack_closed_months() then folds each finished month
+into a single uncompressed zip with a JSON offset index beside it. A document
+inside a bundle is read with one seek and one read, without opening the zip.
+
+Archived files are addressed as "archive/2025/05.zip#invoice_INV001_20250519.pdf";
+read_artifact() accepts those references as well as plain paths, and the
+catalog is updated to point at the new locations.
+
+Usage:
+    python archive.py                 # move documents older than a day
+    python archive.py --pack          # and bundle every closed month
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import threading
+import time
+import zipfile
+
+import catalog
+from utils import atomic_write
+
+# Root of the year/month partitions
+ARCHIVE_DIR = "archive"
+
+# Separates a bundle path from the member name in an archived path
+BUNDLE_SEPARATOR = "#"
+
+# Size of the fixed part of a zip local file header
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+_index_cache = {}
+_index_lock = threading.Lock()
+
+
+def partition_dir(date):
+    """
+    Directory a document dated date is archived into, e.g. archive/2025/05
+    """
+    return os.path.join(ARCHIVE_DIR, f"{date.year:04d}", f"{date.month:02d}")
+
+
+def _same_file(path, other):
+    if os.path.getsize(path) != os.path.getsize(other):
+        return False
+    return _sha256(path) == _sha256(other)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _move_into(path, directory):
+    """
+    Move a file into directory, keeping its name unless a different file already has it
+
+    Returns:
+        str: The new path
+    """
+    os.makedirs(directory, exist_ok=True)
+    base, extension = os.path.splitext(os.path.basename(path))
+    target = os.path.join(directory, base + extension)
+    suffix = 2
+    while os.path.exists(target):
+        if _same_file(path, target):
+            os.remove(path)
+            return target
+        target = os.path.join(directory, f"{base}_{suffix}{extension}")
+        suffix += 1
+    shutil.move(path, target)
+    return target
+
+
+def archive_artifacts(min_age_days=1, backfill=True):
+    """
+    Move finished documents into archive/<year>/<month>/
+
+    Args:
+        min_age_days (float, optional): Only move files not modified for this
+            many days, so documents still being previewed stay put
+        backfill (bool, optional): Catalog loose files before archiving
+
+    Returns:
+        dict: moved, duplicates (identical copies removed) and skipped counts
+    """
+    if backfill:
+        catalog.backfill()
+
+    cutoff = time.time() - min_age_days * 86400
+    moved_jpgs = {}
+    source_dirs = set()
+    summary = {"moved": 0, "duplicates": 0, "skipped": 0}
+
+    for entry in catalog.list_artifacts():
+        pdf_path = entry["pdf_path"]
+        if pdf_path.startswith(ARCHIVE_DIR + os.sep) or not os.path.exists(pdf_path):
+            continue
+        if os.path.getmtime(pdf_path) > cutoff:
+            summary["skipped"] += 1
+            continue
+
+        directory = partition_dir(datetime.date.fromisoformat(entry["date"]))
+        source_dirs.add(os.path.dirname(pdf_path))
+        new_pdf_path = _move_into(pdf_path, directory)
+
+        # Several PDF copies can share one JPG; move it once
+        jpg_path = entry["jpg_path"]
+        new_jpg_path = moved_jpgs.get(jpg_path)
+        if jpg_path and new_jpg_path is None and os.path.exists(jpg_path):
+            source_dirs.add(os.path.dirname(jpg_path))
+            new_jpg_path = moved_jpgs[jpg_path] = _move_into(jpg_path, directory)
+
+        if new_pdf_path != pdf_path and any(
+                other["pdf_path"] == new_pdf_path for other in catalog.search_artifacts(entry["document_number"])):
+            # An identical copy was already archived under this name
+            catalog.remove_artifact(pdf_path)
+            summary["duplicates"] += 1
+        else:
+            catalog.move_artifact(pdf_path, new_pdf_path, new_jpg_path)
+            summary["moved"] += 1
+
+    # Drop dated output folders that are now empty
+    for directory in source_dirs:
+        if directory not in ("", ".", "output") and os.path.isdir(directory) and not os.listdir(directory):
+            os.rmdir(directory)
+
+    return summary
+
+
+def _closed_months(today=None):
+    """
+    Yield (year, month, directory) for every partition before the current month
+    """
+    today = today or datetime.date.today()
+    if not os.path.isdir(ARCHIVE_DIR):
+        return
+    for year in sorted(os.listdir(ARCHIVE_DIR)):
+        year_dir = os.path.join(ARCHIVE_DIR, year)
+        if not (year.isdigit() and os.path.isdir(year_dir)):
+            continue
+        for month in sorted(os.listdir(year_dir)):
+            month_dir = os.path.join(year_dir, month)
+            if month.isdigit() and os.path.isdir(month_dir) and (int(year), int(month)) < (today.year, today.month):
+                yield int(year), int(month), month_dir
+
+
+def _data_offset(f, header_offset):
+    """
+    Offset of a member's data, from its local file header
+    """
+    f.seek(header_offset)
+    fields = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+    name_length, extra_length = fields[-2], fields[-1]
+    return header_offset + _LOCAL_HEADER.size + name_length + extra_length
+
+
+def pack_month(month_dir):
+    """
+    Bundle one month's files into <month>.zip with an offset index
+
+    Members are stored uncompressed: PDFs and JPGs are already compressed,
+    and stored members can be read straight from their offset. Files already
+    in the bundle are kept, so a month can be packed again after late
+    arrivals. The directory is removed once its files are in the bundle.
+
+    Args:
+        month_dir (str): e.g. archive/2025/05
+
+    Returns:
+        str: Path of the bundle
+    """
+    bundle_path = f"{month_dir}.zip"
+    index_path = f"{month_dir}.index.json"
+    names = sorted(os.listdir(month_dir))
+
+    members = {}
+    with zipfile.ZipFile(bundle_path, "a", compression=zipfile.ZIP_STORED) as bundle:
+        existing = {info.filename: info.CRC for info in bundle.infolist()}
+        for name in names:
+            path = os.path.join(month_dir, name)
+            with open(path, "rb") as f:
+                crc = zipfile.crc32(f.read())
+            base, extension = os.path.splitext(name)
+            arcname, suffix = name, 2
+            while arcname in existing and existing[arcname] != crc:
+                arcname, suffix = f"{base}_{suffix}{extension}", suffix + 1
+            if arcname not in existing:
+                bundle.write(path, arcname=arcname)
+                existing[arcname] = crc
+            members[name] = arcname
+
+    index = {}
+    with zipfile.ZipFile(bundle_path) as bundle, open(bundle_path, "rb") as f:
+        for info in bundle.infolist():
+            index[info.filename] = {
+                "offset": _data_offset(f, info.header_offset),
+                "size": info.file_size,
+                "crc32": info.CRC,
+            }
+    atomic_write(index_path, json.dumps(index, sort_keys=True).encode("utf-8"))
+
+    # Repoint the catalog before the loose files go away
+    for name in names:
+        loose = os.path.join(month_dir, name)
+        reference = f"{bundle_path}{BUNDLE_SEPARATOR}{members[name]}"
+        for entry in catalog.search_artifacts(_document_number(name)):
+            if entry["pdf_path"] == loose:
+                catalog.move_artifact(loose, reference)
+            if entry["jpg_path"] == loose:
+                catalog.move_artifact(entry["pdf_path"], entry["pdf_path"], reference)
+
+    shutil.rmtree(month_dir)
+    return bundle_path
+
+
+def _document_number(name):
+    match = catalog._FILENAME_PATTERN.match(name)
+    return match.group(2) if match else name
+
+
+def pack_closed_months(today=None):
+    """
+    Bundle every month partition that has ended
+
+    Returns:
+        list: Paths of the bundles written
+    """
+    return [pack_month(month_dir) for _, _, month_dir in list(_closed_months(today))]
+
+
+def _bundle_index(bundle_path):
+    """
+    Offset index of a bundle, cached until the index file changes
+    """
+    index_path = f"{os.path.splitext(bundle_path)[0]}.index.json"
+    mtime = os.stat(index_path).st_mtime_ns
+    with _index_lock:
+        cached = _index_cache.get(index_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with open(index_path, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    with _index_lock:
+        _index_cache[index_path] = (mtime, index)
+    return index
+
+
+def read_artifact(path):
+    """
+    Read a document from a plain path or a bundle reference
+
+    Args:
+        path (str): A file path, or "<bundle>.zip#<member>" as stored in the catalog
+
+    Returns:
+        bytes: The file contents
+
+    Raises:
+        FileNotFoundError: If the file or bundle member does not exist
+    """
+    bundle_path, separator, member = path.partition(BUNDLE_SEPARATOR)
+    if not separator:
+        with open(path, "rb") as f:
+            return f.read()
+
+    entry = _bundle_index(bundle_path).get(member)
+    if entry is None:
+        raise FileNotFoundError(path)
+    with open(bundle_path, "rb") as f:
+        f.seek(entry["offset"])
+        return f.read(entry["size"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move finished documents into year/month archive partitions")
+    parser.add_argument("--min-age-days", type=float, default=1, help="Only archive files older than this (default: 1)")
+    parser.add_argument("--pack", action="store_true", help="Bundle every closed month into a zip with an offset index")
+    args = parser.parse_args(argv)
+
+    summary = archive_artifacts(min_age_days=args.min_age_days)
+    print(f"Archived {summary['moved']} documents ({summary['duplicates']} duplicate copies removed, "
+          f"{summary['skipped']} too recent)")
+    if args.pack:
+        for bundle_path in pack_closed_months():
+            print(f"Packed {bundle_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Process-wide in-memory store of generated artifact bytes
+
+Sessions keep only artifact paths; the bytes for previews and downloads come
+from here. The store has a byte budget and evicts the least recently used
+entries once it is exceeded. An evicted or changed file is reloaded from
+disk on the next request. Entries are keyed by path and validated against
+the file's mtime and size, so a regenerated file is never served stale.
+"""
+import collections
+import os
+import threading
+
+from archive import BUNDLE_SEPARATOR, read_artifact
+
+# Bytes held in memory before the least recently used artifacts are dropped
+MAX_STORE_BYTES = 64 * 1024 * 1024
+
+
+def _signature(path):
+    """
+    (mtime_ns, size) of a file, or of the bundle holding an archived member
+    """
+    stat = os.stat(path.partition(BUNDLE_SEPARATOR)[0])
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ArtifactStore:
+    """
+    Byte-budgeted LRU map from artifact path to its contents
+
+    Args:
+        max_bytes (int, optional): Memory budget for cached bytes
+    """
+
+    def __init__(self, max_bytes=MAX_STORE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """
+        Return an artifact's bytes, reading it from disk on a miss
+
+        Args:
+            path (str): File path or archive bundle reference
+
+        Returns:
+            bytes or None: The contents, or None if the file does not exist
+        """
+        if not path:
+            return None
+        try:
+            signature = _signature(path)
+        except FileNotFoundError:
+            self.discard(path)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        try:
+            data = read_artifact(path)
+        except FileNotFoundError:
+            return None
+        self._insert(path, signature, data)
+        return data
+
+    def put(self, path, data):
+        """
+        Add bytes that were just written to path, saving the reload on first view
+        """
+        try:
+            signature = _signature(path)
+        except FileNotFoundError:
+            return
+        self._insert(path, signature, data)
+
+    def discard(self, path):
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._bytes -= len(entry[1])
+
+    def _insert(self, path, signature, data):
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self._bytes -= len(previous[1])
+            if len(data) > self.max_bytes:
+                return
+            self._entries[path] = (signature, data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        """
+        Memory use and hit rate
+
+        Returns:
+            dict: entries, bytes, max_bytes, hits, misses and evictions
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """
+    Return the process-wide artifact store
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore()
+    return _store
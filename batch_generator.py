@@ -0,0 +1,710 @@
+"""
+Headless bulk generation of invoices and receipts from CSV or JSONL exports
+
+Usage:
+    python batch_generator.py rows.csv --jpg --workers 4
+    python batch_generator.py rows.csv --jpg --pipeline --workers 4 --raster-workers 4
+    python batch_generator.py rows.csv --statement --from 2025-05-01 --to 2025-05-31
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+from PIL import Image
+
+from catalog import record_artifact
+from company_details import COMPANY_NAME, company_kwargs
+from document_pipeline import render_document, render_statement
+from image_converter import encode_jpeg, jpg_output_path, rasterize_page, RASTER_PROFILES
+from invoice_generator import (
+    claim_invoice_numbers, format_invoice_number, generate_invoice_text, parse_invoice_number,
+    reserve_invoice_numbers, reserve_statement_numbers
+)
+from openai_helper import description_context, generate_descriptions
+from pdf_generator import PDF_PROFILES, pdf_filename, render_pdf
+from render_cache import cache_key, get_render_cache
+from staged_pipeline import Stage, run_pipeline
+from utils import atomic_write, join_inside
+
+# Defaults applied to optional columns
+ROW_DEFAULTS = {
+    "document_type": "Invoice",
+    "transaction_type": "Income",
+    "entity_type": "Individual",
+    "payment_method": "Bank Transfer",
+    "currency": "GBP",
+    "notes": "",
+    "description": "",
+    "invoice_number": "",
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y")
+
+
+def read_rows(path):
+    """
+    Stream rows from a CSV or JSONL file without loading the whole file
+
+    Args:
+        path (str): Path to a .csv, .jsonl or .ndjson file
+
+    Yields:
+        dict: One raw row per document
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if extension in (".jsonl", ".ndjson"):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        elif extension == ".csv":
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            raise ValueError(f"Unsupported input format: {extension}")
+
+
+def parse_date(value):
+    """
+    Parse a row date, defaulting to today when the column is empty
+    """
+    if not value:
+        return datetime.date.today()
+    if isinstance(value, datetime.date):
+        return value
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(str(value).strip(), date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {value!r}")
+
+
+def normalize_row(row):
+    """
+    Validate a raw row and fill in defaults
+
+    Args:
+        row (dict): Raw row from read_rows
+
+    Returns:
+        dict: Row with every column generate_pdf needs
+    """
+    normalized = dict(ROW_DEFAULTS)
+    normalized.update({key: value for key, value in row.items() if value not in (None, "")})
+
+    if not normalized.get("entity_name"):
+        raise ValueError("entity_name is required")
+    if normalized["document_type"] not in ("Invoice", "Receipt"):
+        raise ValueError(f"Unknown document_type: {normalized['document_type']}")
+    if normalized["transaction_type"] not in ("Income", "Expense"):
+        raise ValueError(f"Unknown transaction_type: {normalized['transaction_type']}")
+
+    normalized["amount"] = float(normalized["amount"])
+    normalized["date"] = parse_date(normalized.get("date"))
+    normalized["invoice_number"] = str(normalized["invoice_number"]).strip()
+    if normalized["invoice_number"]:
+        number = parse_invoice_number(normalized["invoice_number"], normalized["document_type"])
+        normalized["invoice_number"] = format_invoice_number(number, normalized["document_type"])
+    return normalized
+
+
+def assign_numbers(rows):
+    """
+    Give every row without an explicit number one from a reserved block
+
+    One counter reservation is made per document type for the whole chunk.
+    Explicit numbers are claimed in the issued-number index first; a number
+    that was already issued is refused rather than issued twice.
+
+    Returns:
+        list: (row, error) for every row whose explicit number was refused
+    """
+    pending, explicit = {}, {}
+    for row in rows:
+        typed = explicit if row["invoice_number"] else pending
+        typed.setdefault(row["document_type"], []).append(row)
+
+    refused = []
+    for document_type, typed_rows in explicit.items():
+        # The first row with a number keeps it; repeats within the input are refused
+        claims = {}
+        for row in typed_rows:
+            number = parse_invoice_number(row["invoice_number"], document_type)
+            if number in claims:
+                refused.append((row, f"{row['invoice_number']} appears more than once in the input"))
+            else:
+                claims[number] = row
+        for number in claim_invoice_numbers(list(claims), document_type):
+            refused.append((claims[number], f"{claims[number]['invoice_number']} has already been issued"))
+
+    for document_type, typed_rows in pending.items():
+        numbers = reserve_invoice_numbers(document_type, len(typed_rows))
+        for row, number in zip(typed_rows, numbers):
+            row["invoice_number"] = number
+    return refused
+
+
+def fill_descriptions(rows):
+    """
+    Give every row without a description one from the description provider
+
+    The whole chunk is sent as one batched request set, and repeat clients are
+    answered from the description cache.
+    """
+    pending = [row for row in rows if not row["description"]]
+    requests = [
+        (row["entity_name"], description_context(row["document_type"], row["transaction_type"], row["entity_type"]))
+        for row in pending
+    ]
+    for row, description in zip(pending, generate_descriptions(requests)):
+        row["description"] = description
+
+
+def _manifest_record(row):
+    return {
+        "row": row["row"],
+        "invoice_number": row["invoice_number"],
+        "document_type": row["document_type"],
+        "transaction_type": row["transaction_type"],
+        "entity_name": row["entity_name"],
+        "amount": row["amount"],
+        "currency": row["currency"],
+        "date": row["date"].isoformat(),
+    }
+
+
+def _document_fields(row, description, profile="standard"):
+    """
+    Keyword arguments for render_pdf/render_document for a normalized row
+    """
+    return dict(
+        document_type=row["document_type"],
+        transaction_type=row["transaction_type"],
+        entity_name=row["entity_name"],
+        entity_type=row["entity_type"],
+        amount=row["amount"],
+        date=row["date"],
+        payment_method=row["payment_method"],
+        description=description,
+        notes=row["notes"],
+        invoice_number=row["invoice_number"],
+        currency=row["currency"],
+        profile=profile,
+        **company_kwargs()
+    )
+
+
+def _text_version(row, description):
+    return generate_invoice_text(
+        transaction_type=row["transaction_type"],
+        entity_name=row["entity_name"],
+        amount=row["amount"],
+        date=row["date"],
+        description=description,
+        company_name=COMPANY_NAME,
+        currency=row["currency"]
+    )
+
+
+def render_row(row, output_dir, with_jpg, profile="standard"):
+    """
+    Render one document; runs inside a worker process
+
+    Args:
+        row (dict): Normalized row with an assigned invoice number
+        output_dir (str): Directory the PDF is written to
+        with_jpg (bool): Also rasterize the first page to JPG
+        profile (str, optional): Key of pdf_generator.PDF_PROFILES
+
+    Returns:
+        dict: Manifest record for the document
+    """
+    started = time.perf_counter()
+    record = _manifest_record(row)
+    try:
+        description = row["description"]
+
+        artifacts = render_document(
+            output_dir=output_dir,
+            with_jpg=with_jpg,
+            with_preview=False,
+            **_document_fields(row, description, profile)
+        )
+
+        record.update({
+            "status": "ok",
+            "description": description,
+            "pdf_path": artifacts["pdf_path"],
+            "jpg_path": artifacts["jpg_path"],
+            "text_version": _text_version(row, description),
+        })
+    except Exception as e:
+        record.update({"status": "error", "error": str(e)})
+
+    record["seconds"] = round(time.perf_counter() - started, 4)
+    return record
+
+
+def numbered_rows(input_path, chunk_size=100):
+    """
+    Read, validate and number rows, reserving numbers one chunk at a time
+
+    Yields:
+        tuple: (row number, normalized row or None, error message or None)
+    """
+    rows = enumerate(read_rows(input_path), start=1)
+    while True:
+        raw_chunk = list(islice(rows, chunk_size))
+        if not raw_chunk:
+            return
+
+        chunk = []
+        for row_number, raw in raw_chunk:
+            try:
+                row = normalize_row(raw)
+            except (ValueError, KeyError, TypeError) as e:
+                yield row_number, None, str(e)
+                continue
+            row["row"] = row_number
+            chunk.append(row)
+
+        refused = assign_numbers(chunk)
+        for row, error in refused:
+            yield row["row"], None, error
+        refused_rows = {id(row) for row, _ in refused}
+        chunk = [row for row in chunk if id(row) not in refused_rows]
+        fill_descriptions(chunk)
+        for row in chunk:
+            yield row["row"], row, None
+
+
+def run_batch(input_path, output_dir, manifest_path=None, workers=None, with_jpg=False, chunk_size=100,
+              profile="standard"):
+    """
+    Generate every document in input_path across a process pool
+
+    Args:
+        input_path (str): CSV or JSONL file with one document per row
+        output_dir (str): Directory for generated PDFs
+        manifest_path (str, optional): JSONL results manifest. Defaults to
+            manifest.jsonl inside output_dir.
+        workers (int, optional): Process pool size. Defaults to the CPU count.
+        with_jpg (bool): Also produce JPGs of the first page
+        chunk_size (int): Rows read and numbered per counter reservation
+        profile (str, optional): Key of pdf_generator.PDF_PROFILES
+
+    Returns:
+        dict: Summary with counts, elapsed seconds and docs/sec
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(output_dir, "manifest.jsonl")
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+
+    summary = {"ok": 0, "error": 0}
+    started = time.perf_counter()
+
+    def write_record(manifest, record):
+        summary[record["status"]] += 1
+        manifest.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def drain(manifest, futures):
+        done, pending = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            write_record(manifest, future.result())
+        return pending
+
+    with open(manifest_path, "w", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = set()
+        for row_number, row, error in numbered_rows(input_path, chunk_size):
+            if error:
+                write_record(manifest, {"row": row_number, "status": "error", "error": error})
+                continue
+            if len(futures) >= max_in_flight:
+                futures = drain(manifest, futures)
+            futures.add(pool.submit(render_row, row, output_dir, with_jpg, profile))
+
+        while futures:
+            futures = drain(manifest, futures)
+
+    elapsed = time.perf_counter() - started
+    total = summary["ok"] + summary["error"]
+    summary.update({
+        "total": total,
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(summary["ok"] / elapsed, 2) if elapsed else 0.0,
+        "manifest": manifest_path,
+    })
+    return summary
+
+
+def build_pdf(fields):
+    """
+    Build one PDF, or fetch it from the render cache; runs in the build stage's process pool
+
+    Returns:
+        bytes: The PDF
+    """
+    cache = get_render_cache()
+    key = cache_key(fields)
+    pdf_data = cache.get(key, "pdf")
+    if pdf_data is None:
+        pdf_data = render_pdf(**fields)
+        cache.put(key, "pdf", pdf_data)
+    return pdf_data
+
+
+def run_pipelined_batch(input_path, output_dir, manifest_path=None, build_workers=None,
+                        raster_workers=None, encode_workers=1, write_workers=1,
+                        with_jpg=False, chunk_size=100, queue_size=8, raster_profile="print",
+                        profile="standard"):
+    """
+    Generate every document in input_path through a staged pipeline
+
+    Documents flow through build -> rasterize -> encode -> write, with a
+    bounded queue in front of each stage. PDFs are built in a process pool
+    while earlier documents are being rasterized by pdftoppm subprocesses, so
+    CPU-bound ReportLab work and poppler overlap instead of alternating.
+
+    Args:
+        input_path (str): CSV or JSONL file with one document per row
+        output_dir (str): Directory for generated PDFs
+        manifest_path (str, optional): JSONL results manifest. Defaults to
+            manifest.jsonl inside output_dir.
+        build_workers (int, optional): PDF build processes. Defaults to the CPU count.
+        raster_workers (int, optional): Concurrent rasterizations. Defaults to the CPU count.
+        encode_workers (int, optional): JPEG encode threads (only busy when
+            pdf2image is used instead of pdftoppm)
+        write_workers (int, optional): Threads writing files and the manifest
+        with_jpg (bool): Also produce JPGs of the first page
+        chunk_size (int): Rows read and numbered per counter reservation
+        queue_size (int): Capacity of each stage's inbox
+        raster_profile (str, optional): Key of image_converter.RASTER_PROFILES
+        profile (str, optional): Key of pdf_generator.PDF_PROFILES
+
+    Returns:
+        dict: Summary with counts, elapsed seconds, docs/sec and per-stage
+            utilization
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(output_dir, "manifest.jsonl")
+    build_workers = build_workers or os.cpu_count() or 1
+    raster_workers = raster_workers or os.cpu_count() or 1
+    quality = RASTER_PROFILES[raster_profile]["quality"]
+
+    summary = {"ok": 0, "error": 0}
+    manifest_lock = threading.Lock()
+
+    def jobs():
+        for row_number, row, error in numbered_rows(input_path, chunk_size):
+            if error:
+                yield {"record": {"row": row_number}, "error": error}
+                continue
+            description = row["description"]
+            yield {
+                "row": row,
+                "description": description,
+                "fields": _document_fields(row, description, profile),
+                "record": _manifest_record(row),
+            }
+
+    def build(job):
+        job["started"] = time.perf_counter()
+        job["pdf_data"] = pool.submit(build_pdf, job["fields"]).result()
+
+    # A failed JPG does not fail the document: the PDF is still written and
+    # the manifest records jpg_error, as render_document's callers do
+    def rasterize(job):
+        try:
+            job["raster"] = rasterize_page(job["pdf_data"], 1, raster_profile)
+        except Exception as e:
+            job["jpg_error"] = f"rasterize: {e}"
+
+    def encode(job):
+        raster = job.pop("raster", None)
+        try:
+            job["jpg_data"] = encode_jpeg(raster, quality) if isinstance(raster, Image.Image) else raster
+        except Exception as e:
+            job["jpg_error"] = f"encode: {e}"
+
+    def write(job):
+        record = job["record"]
+        if "error" not in job:
+            row, fields = job["row"], job["fields"]
+            filename = pdf_filename(row["document_type"], row["invoice_number"], row["date"])
+            pdf_path = join_inside(output_dir, filename)
+            atomic_write(pdf_path, job["pdf_data"])
+
+            jpg_path = None
+            if job.get("jpg_data"):
+                try:
+                    jpg_path = jpg_output_path(
+                        filename, row["entity_name"], row["transaction_type"], output_dir, row["date"]
+                    )
+                    atomic_write(jpg_path, job["jpg_data"])
+                except OSError as e:
+                    jpg_path, job["jpg_data"], job["jpg_error"] = None, None, f"write: {e}"
+            elif with_jpg and "jpg_error" not in job:
+                job["jpg_error"] = "The first page could not be rasterized"
+
+            record_artifact(
+                document_type=row["document_type"],
+                document_number=row["invoice_number"],
+                date=row["date"],
+                pdf_path=pdf_path,
+                pdf_data=job["pdf_data"],
+                jpg_path=jpg_path,
+                jpg_data=job.get("jpg_data"),
+                transaction_type=row["transaction_type"],
+                entity_name=row["entity_name"],
+                amount=row["amount"],
+                currency=fields["currency"]
+            )
+            record.update({
+                "status": "ok",
+                "description": job["description"],
+                "pdf_path": pdf_path,
+                "jpg_path": jpg_path,
+                "text_version": _text_version(row, job["description"]),
+                "seconds": round(time.perf_counter() - job["started"], 4),
+            })
+            if job.get("jpg_error"):
+                record["jpg_error"] = job["jpg_error"]
+        else:
+            record.update({"status": "error", "error": job["error"]})
+
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with manifest_lock:
+            summary[record["status"]] += 1
+            manifest.write(line)
+
+    stages = [Stage("build", build, build_workers)]
+    if with_jpg:
+        stages += [Stage("rasterize", rasterize, raster_workers), Stage("encode", encode, encode_workers)]
+    stages.append(Stage("write", write, write_workers, always=True))
+
+    with open(manifest_path, "w", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=build_workers) as pool:
+        result = run_pipeline(jobs(), stages, queue_size=queue_size)
+
+    elapsed = result["seconds"]
+    summary.update({
+        "total": summary["ok"] + summary["error"],
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(summary["ok"] / elapsed, 2) if elapsed else 0.0,
+        "stages": result["stages"],
+        "manifest": manifest_path,
+    })
+    return summary
+
+
+def render_statement_group(statement_number, rows, output_dir, include_details, profile="standard"):
+    """
+    Render one entity's rows as a single statement; runs inside a worker process
+
+    Returns:
+        dict: Manifest record for the statement
+    """
+    started = time.perf_counter()
+    record = {
+        "statement_number": statement_number,
+        "entity_name": rows[0]["entity_name"],
+        "rows": [row["row"] for row in rows],
+        "invoice_numbers": [row["invoice_number"] for row in rows],
+    }
+    try:
+        transactions = []
+        for row in rows:
+            transaction = {key: row[key] for key in (
+                "document_type", "transaction_type", "entity_name", "entity_type", "amount",
+                "date", "payment_method", "notes", "invoice_number", "currency"
+            )}
+            transaction["description"] = row["description"]
+            transactions.append(transaction)
+
+        artifacts = render_statement(
+            transactions,
+            statement_number,
+            max(row["date"] for row in rows),
+            output_dir=output_dir,
+            include_details=include_details,
+            profile=profile,
+            **company_kwargs()
+        )
+        record.update({"status": "ok", "pdf_path": artifacts["pdf_path"], "bytes": len(artifacts["pdf_data"])})
+    except Exception as e:
+        record.update({"status": "error", "error": str(e)})
+
+    record["seconds"] = round(time.perf_counter() - started, 4)
+    return record
+
+
+def run_statements(input_path, output_dir, manifest_path=None, workers=None, entity_name=None,
+                   start_date=None, end_date=None, include_details=True, profile="standard"):
+    """
+    Render one multi-transaction statement per entity instead of a PDF per row
+
+    Every row still receives its own invoice or receipt number.
+
+    Args:
+        input_path (str): CSV or JSONL file with one transaction per row
+        output_dir (str): Directory for the statement PDFs
+        manifest_path (str, optional): JSONL results manifest. Defaults to
+            manifest.jsonl inside output_dir.
+        workers (int, optional): Process pool size. Defaults to the CPU count.
+        entity_name (str, optional): Only include this entity
+        start_date (date, optional): Only include rows on or after this date
+        end_date (date, optional): Only include rows on or before this date
+        include_details (bool): Add a detail page per transaction
+        profile (str, optional): Key of pdf_generator.PDF_PROFILES
+
+    Returns:
+        dict: Summary with counts, elapsed seconds and transactions/sec
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(output_dir, "manifest.jsonl")
+    workers = workers or os.cpu_count() or 1
+
+    summary = {"ok": 0, "error": 0}
+    started = time.perf_counter()
+
+    with open(manifest_path, "w", encoding="utf-8") as manifest:
+        groups = {}
+        for row_number, raw in enumerate(read_rows(input_path), start=1):
+            try:
+                row = normalize_row(raw)
+            except (ValueError, KeyError, TypeError) as e:
+                summary["error"] += 1
+                manifest.write(json.dumps({"row": row_number, "status": "error", "error": str(e)}) + "\n")
+                continue
+            if entity_name and row["entity_name"] != entity_name:
+                continue
+            if (start_date and row["date"] < start_date) or (end_date and row["date"] > end_date):
+                continue
+            row["row"] = row_number
+            groups.setdefault(row["entity_name"], []).append(row)
+
+        grouped_rows = [row for rows in groups.values() for row in rows]
+        refused = assign_numbers(grouped_rows)
+        for row, error in refused:
+            summary["error"] += 1
+            manifest.write(json.dumps({"row": row["row"], "status": "error", "error": error}) + "\n")
+        refused_rows = {id(row) for row, _ in refused}
+        groups = {
+            entity: kept for entity, rows in groups.items()
+            if (kept := [row for row in rows if id(row) not in refused_rows])
+        }
+        grouped_rows = [row for rows in groups.values() for row in rows]
+        fill_descriptions(grouped_rows)
+
+        transactions = sum(len(rows) for rows in groups.values())
+        statement_numbers = reserve_statement_numbers(len(groups), datetime.date.today()) if groups else []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(render_statement_group, statement_number, rows, output_dir, include_details, profile)
+                for statement_number, rows in zip(statement_numbers, groups.values())
+            ]
+            for future in futures:
+                record = future.result()
+                summary[record["status"]] += 1
+                manifest.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    elapsed = time.perf_counter() - started
+    summary.update({
+        "total": summary["ok"] + summary["error"],
+        "transactions": transactions,
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(transactions / elapsed, 2) if elapsed else 0.0,
+        "manifest": manifest_path,
+    })
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate invoices and receipts from a CSV or JSONL file")
+    parser.add_argument("input", help="CSV or JSONL file, one document per row")
+    parser.add_argument("--output-dir", default=None, help="Directory for generated files (default: output/batch_<timestamp>)")
+    parser.add_argument("--manifest", default=None, help="Results manifest path (default: <output-dir>/manifest.jsonl)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--jpg", action="store_true", help="Also render a JPG of each document")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Rows numbered per counter reservation")
+    parser.add_argument("--pipeline", action="store_true", help="Use the staged build/rasterize/encode/write pipeline")
+    parser.add_argument("--raster-workers", type=int, default=None, help="Pipeline mode: concurrent rasterizations (default: CPU count)")
+    parser.add_argument("--queue-size", type=int, default=8, help="Pipeline mode: capacity of each stage queue")
+    parser.add_argument("--statement", action="store_true", help="Render one multi-page statement per entity")
+    parser.add_argument("--entity", default=None, help="Statement mode: only this entity")
+    parser.add_argument("--from", dest="start_date", type=parse_date, default=None, help="Statement mode: first date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end_date", type=parse_date, default=None, help="Statement mode: last date (YYYY-MM-DD)")
+    parser.add_argument("--summary-only", action="store_true", help="Statement mode: skip the per-transaction detail pages")
+    parser.add_argument("--profile", choices=sorted(PDF_PROFILES), default="standard",
+                        help="PDF output profile; compact makes the smallest files (default: standard)")
+    args = parser.parse_args(argv)
+
+    output_dir = args.output_dir or os.path.join(
+        "output", f"batch_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+    if args.statement:
+        summary = run_statements(
+            args.input,
+            output_dir,
+            manifest_path=args.manifest,
+            workers=args.workers,
+            entity_name=args.entity,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            include_details=not args.summary_only,
+            profile=args.profile
+        )
+        print(f"Generated {summary['ok']}/{summary['total']} statements covering {summary['transactions']} "
+              f"transactions in {summary['seconds']}s ({summary['docs_per_sec']} transactions/sec), "
+              f"{summary['error']} errors")
+        print(f"Manifest: {summary['manifest']}")
+        return 0 if summary["error"] == 0 else 1
+
+    if args.pipeline:
+        summary = run_pipelined_batch(
+            args.input,
+            output_dir,
+            manifest_path=args.manifest,
+            build_workers=args.workers,
+            raster_workers=args.raster_workers,
+            with_jpg=args.jpg,
+            chunk_size=args.chunk_size,
+            queue_size=args.queue_size,
+            profile=args.profile
+        )
+        print(f"Generated {summary['ok']}/{summary['total']} documents in {summary['seconds']}s "
+              f"({summary['docs_per_sec']} docs/sec), {summary['error']} errors")
+        for name, stage in summary["stages"].items():
+            print(f"  {name:<10} {stage['workers']} workers  {stage['utilization'] * 100:5.1f}% busy  "
+                  f"{stage['busy_seconds']}s  peak queue {stage['max_queue_depth']}")
+        print(f"Manifest: {summary['manifest']}")
+        return 0 if summary["error"] == 0 else 1
+
+    summary = run_batch(
+        args.input,
+        output_dir,
+        manifest_path=args.manifest,
+        workers=args.workers,
+        with_jpg=args.jpg,
+        chunk_size=args.chunk_size,
+        profile=args.profile
+    )
+    print(f"Generated {summary['ok']}/{summary['total']} documents in {summary['seconds']}s "
+          f"({summary['docs_per_sec']} docs/sec), {summary['error']} errors")
+    print(f"Manifest: {summary['manifest']}")
+    return 0 if summary["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,640 @@
+"""
+Stand-alone benchmarks for the document generation pipeline
+
+Every case runs in a fresh child process inside a scratch directory, so
+peak RSS is per case and the repository's data/ and output/ are untouched.
+Results are printed and can be written as JSON to compare between commits.
+
+Usage:
+    python benchmark.py --iterations 50 --output bench.json
+    python benchmark.py --cases pdf_income,end_to_end_1000 --compare bench.json
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Inputs used for every generate_pdf benchmark case
+SAMPLE_DOCUMENT = {
+    "document_type": "Invoice",
+    "transaction_type": "Income",
+    "entity_name": "Benchmark Client Ltd",
+    "entity_type": "Company",
+    "amount": 1250.0,
+    "date": datetime.date(2025, 5, 19),
+    "payment_method": "Bank Transfer",
+    "description": "Web portal implementation for client management - DataVista System",
+    "notes": "",
+    "invoice_number": "INV999",
+    "currency": "GBP",
+}
+
+SAMPLE_NOTES = "Milestone 2 of 3. Includes deployment, handover documentation and two weeks of support."
+
+
+def time_calls(func, iterations):
+    """
+    Call func repeatedly and collect per-call latencies
+
+    Returns:
+        list: Latencies in seconds
+    """
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def summarize(latencies, docs_per_call=1):
+    """
+    Reduce latencies to p50/p95 milliseconds and docs/sec
+    """
+    ordered = sorted(latencies)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    total = sum(ordered)
+    return {
+        "iterations": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[p95_index] * 1000, 3),
+        "docs_per_sec": round(len(ordered) * docs_per_call / total, 2) if total else 0.0,
+    }
+
+
+def sample_fields(**overrides):
+    """
+    Keyword arguments for render_pdf/generate_pdf built from SAMPLE_DOCUMENT
+    """
+    from company_details import company_kwargs
+
+    fields = dict(SAMPLE_DOCUMENT, **company_kwargs())
+    fields.update(overrides)
+    return fields
+
+
+def generate_sample_pdf(**overrides):
+    """
+    Build the sample document with generate_pdf
+    """
+    import pdf_generator
+
+    return pdf_generator.generate_pdf(**sample_fields(**overrides))
+
+
+def install_sample_logo():
+    """
+    Write a 1200x480 photographic-noise logo to assets/company_logo.png
+    """
+    from PIL import Image
+
+    os.makedirs("assets", exist_ok=True)
+    Image.frombytes("RGB", (1200, 480), os.urandom(1200 * 480 * 3)).save("assets/company_logo.png")
+
+
+def poppler_available():
+    """
+    Whether pdftoppm or pdf2image can rasterize in this environment
+    """
+    import image_converter
+
+    if image_converter._find_pdftoppm():
+        return True
+    try:
+        from pdf2image.pdf2image import pdfinfo_from_bytes
+        import pdf_generator
+
+        pdfinfo_from_bytes(pdf_generator.render_pdf(**sample_fields()))
+        return True
+    except Exception:
+        return False
+
+
+# Benchmark cases. Each takes the parsed arguments and returns a result
+# dict; a "skipped" key marks a case that cannot run in this environment.
+
+def case_numbering(args):
+    import invoice_generator
+
+    single = summarize(time_calls(lambda: invoice_generator.get_next_invoice_number("Invoice"), args.iterations))
+    block = summarize(
+        time_calls(lambda: invoice_generator.reserve_invoice_numbers("Invoice", 100), args.iterations),
+        docs_per_call=100
+    )
+    return dict(single, block_of_100=block)
+
+
+def _pdf_case(args, with_logo, **overrides):
+    if with_logo:
+        install_sample_logo()
+    pdf_path = generate_sample_pdf(**overrides)  # warm-up
+    result = summarize(time_calls(lambda: generate_sample_pdf(**overrides), args.iterations))
+    result["bytes"] = os.path.getsize(pdf_path)
+    return result
+
+
+def case_pdf_income(args):
+    return _pdf_case(args, with_logo=False)
+
+
+def case_pdf_expense(args):
+    return _pdf_case(args, with_logo=False, transaction_type="Expense")
+
+
+def case_pdf_income_notes(args):
+    return _pdf_case(args, with_logo=False, notes=SAMPLE_NOTES)
+
+
+def case_pdf_income_logo(args):
+    return _pdf_case(args, with_logo=True)
+
+
+def case_pdf_income_logo_notes(args):
+    return _pdf_case(args, with_logo=True, notes=SAMPLE_NOTES)
+
+
+def case_pdf_regenerate(args):
+    """
+    Re-render the same document number with a new description from the layout cache
+    """
+    from pdf_generator import render_pdf
+
+    install_sample_logo()
+    render_pdf(reuse_layout=True, **sample_fields())  # first render fills the layout cache
+    counter = iter(range(10 ** 9))
+    result = summarize(time_calls(
+        lambda: render_pdf(reuse_layout=True, **sample_fields(description=f"Regenerated description {next(counter)}")),
+        args.iterations
+    ))
+    fresh = summarize(time_calls(
+        lambda: render_pdf(**sample_fields(description=f"Regenerated description {next(counter)}")),
+        args.iterations
+    ))
+    result["fresh_p50_ms"] = fresh["p50_ms"]
+    return result
+
+
+def case_pdf_size(args):
+    """
+    File sizes of the standard and compact PDF profiles over a mix of documents
+
+    Income and expense documents, with and without notes, are generated
+    without a logo and then with the photographic sample logo. Latencies
+    are for the compact profile; the standard profile's p50 is reported
+    alongside.
+    """
+    variants = [
+        dict(transaction_type=transaction_type, notes=notes)
+        for transaction_type in ("Income", "Expense") for notes in ("", SAMPLE_NOTES)
+    ]
+
+    def sizes(profile):
+        result = []
+        for variant in variants:
+            with open(generate_sample_pdf(profile=profile, **variant), "rb") as f:
+                result.append(len(f.read()))
+        return result
+
+    def stats(values):
+        return {
+            "mean": round(statistics.mean(values)),
+            "min": min(values),
+            "max": max(values),
+            "total": sum(values),
+        }
+
+    result = {}
+    for logo in ("no_logo", "logo"):
+        if logo == "logo":
+            install_sample_logo()
+        standard, compact = sizes("standard"), sizes("compact")
+        result[f"{logo}_standard_bytes"] = stats(standard)
+        result[f"{logo}_compact_bytes"] = stats(compact)
+        result[f"{logo}_reduction_pct"] = round((1 - sum(compact) / sum(standard)) * 100, 1)
+
+    standard_timing = summarize(time_calls(lambda: generate_sample_pdf(profile="standard"), args.iterations))
+    result.update(summarize(time_calls(lambda: generate_sample_pdf(profile="compact"), args.iterations)))
+    result["standard_p50_ms"] = standard_timing["p50_ms"]
+    return result
+
+
+def case_stylesheet(args):
+    """
+    Compare rebuilding the stylesheet per document with the shared template
+
+    The setup cases isolate the style construction itself; the build cases
+    alternate both variants call by call so drift affects them equally.
+    """
+    import pdf_generator
+
+    setup_per_document = summarize(time_calls(pdf_generator.InvoiceTemplate, args.iterations))
+    setup_shared = summarize(time_calls(pdf_generator.get_invoice_template, args.iterations))
+
+    def rebuilt_per_document():
+        pdf_generator._invoice_template = None
+        generate_sample_pdf()
+
+    # Warm up imports, font metrics and the filesystem before timing
+    generate_sample_pdf()
+
+    per_document, shared = [], []
+    for _ in range(args.iterations):
+        per_document.extend(time_calls(rebuilt_per_document, 1))
+        shared.extend(time_calls(generate_sample_pdf, 1))
+    per_document, shared = summarize(per_document), summarize(shared)
+
+    return dict(shared, **{
+        "style_setup_per_document": setup_per_document,
+        "style_setup_shared": setup_shared,
+        "build_stylesheet_per_document": per_document,
+        "saved_ms_per_document": round(per_document["p50_ms"] - shared["p50_ms"], 3),
+    })
+
+
+def _raster_case(args, dpi):
+    if not poppler_available():
+        return {"skipped": "poppler (pdftoppm) is not installed"}
+    import image_converter
+
+    image_converter.RASTER_PROFILES[f"bench_{dpi}"] = {"dpi": dpi, "quality": 90}
+    pdf_path = generate_sample_pdf()
+    jpg_paths = []
+    result = summarize(time_calls(
+        lambda: jpg_paths.append(
+            image_converter.convert_pdf_to_jpg(pdf_path, "Benchmark", "Income", profile=f"bench_{dpi}")
+        ),
+        args.iterations
+    ))
+    result["bytes"] = os.path.getsize(jpg_paths[-1])
+    return result
+
+
+def case_raster_72dpi(args):
+    return _raster_case(args, 72)
+
+
+def case_raster_150dpi(args):
+    return _raster_case(args, 150)
+
+
+def case_raster_300dpi(args):
+    return _raster_case(args, 300)
+
+
+def _end_to_end(count, with_jpg):
+    import document_pipeline
+    import invoice_generator
+
+    latencies = []
+    for number in invoice_generator.reserve_invoice_numbers("Invoice", count):
+        started = time.perf_counter()
+        document_pipeline.render_document(
+            output_dir="output", with_jpg=with_jpg, use_cache=False,
+            **sample_fields(invoice_number=number)
+        )
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def case_end_to_end_single(args):
+    with_jpg = poppler_available()
+    result = summarize(_end_to_end(args.iterations, with_jpg))
+    result["with_jpg"] = with_jpg
+    return result
+
+
+def case_end_to_end_1000(args):
+    with_jpg = poppler_available() and args.bulk_jpg
+    started = time.perf_counter()
+    latencies = _end_to_end(args.docs, with_jpg)
+    elapsed = time.perf_counter() - started
+    result = summarize(latencies)
+    result.update({
+        "docs": args.docs,
+        "with_jpg": with_jpg,
+        "wall_seconds": round(elapsed, 3),
+        "docs_per_sec": round(args.docs / elapsed, 2),
+    })
+    return result
+
+
+def case_statement(args):
+    """
+    Compare N separate documents with one statement covering the same N transactions
+    """
+    import pdf_generator
+    from company_details import company_kwargs
+
+    transactions = args.statement_size
+    rows = [
+        dict(SAMPLE_DOCUMENT, invoice_number=f"INV{index:03d}", amount=100.0 + index,
+             date=SAMPLE_DOCUMENT["date"] + datetime.timedelta(days=index % 28))
+        for index in range(1, transactions + 1)
+    ]
+
+    started = time.perf_counter()
+    separate_bytes = sum(len(pdf_generator.render_pdf(**row, **company_kwargs())) for row in rows)
+    separate_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    statement_bytes = len(pdf_generator.render_statement_pdf(
+        rows, "STM-BENCH", SAMPLE_DOCUMENT["date"], **company_kwargs()))
+    statement_seconds = time.perf_counter() - started
+
+    return {
+        "transactions": transactions,
+        "docs_per_sec": round(transactions / statement_seconds, 2),
+        "separate": {"files": transactions, "bytes": separate_bytes, "seconds": round(separate_seconds, 4)},
+        "statement": {"files": 1, "bytes": statement_bytes, "seconds": round(statement_seconds, 4)},
+        "bytes_ratio": round(statement_bytes / separate_bytes, 3),
+        "time_ratio": round(statement_seconds / separate_seconds, 3),
+    }
+
+
+def case_batch_pipeline(args):
+    """
+    Compare the process-pool batch with the staged build/rasterize/encode/write pipeline
+    """
+    import batch_generator
+
+    with_jpg = poppler_available() and args.bulk_jpg
+    docs = min(args.docs, 200)
+    with open("rows.jsonl", "w", encoding="utf-8") as f:
+        for index in range(docs):
+            row = sample_fields(invoice_number="", date=SAMPLE_DOCUMENT["date"].isoformat())
+            f.write(json.dumps({key: row[key] for key in (
+                "document_type", "transaction_type", "entity_name", "entity_type",
+                "amount", "date", "payment_method", "description", "currency")}) + "\n")
+
+    pooled = batch_generator.run_batch("rows.jsonl", "pooled", with_jpg=with_jpg)
+    staged = batch_generator.run_pipelined_batch("rows.jsonl", "staged", with_jpg=with_jpg)
+    return {
+        "docs": docs,
+        "with_jpg": with_jpg,
+        "docs_per_sec": staged["docs_per_sec"],
+        "pooled_docs_per_sec": pooled["docs_per_sec"],
+        "stage_utilization": {name: stage["utilization"] for name, stage in staged["stages"].items()},
+    }
+
+
+def case_descriptions(args):
+    """
+    Batched provider requests against the local stub server, then the cache and the latency budget
+    """
+    import description_providers
+    import openai_helper
+    from description_stub_server import start_stub_server
+
+    delay = 0.2
+    server = start_stub_server(delay=delay)
+    try:
+        provider = description_providers.ChatCompletionsProvider("stub", server.url, "stub", "stub")
+        requests = [(f"Client {index}", "Invoice, Income, Company") for index in range(min(args.docs, 200))]
+
+        started = time.perf_counter()
+        openai_helper.generate_descriptions(requests, provider=provider)
+        cold_seconds = time.perf_counter() - started
+        http_requests = server.requests
+
+        started = time.perf_counter()
+        openai_helper.generate_descriptions(requests, provider=provider)
+        cached_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        openai_helper.generate_descriptions([("New Client", "")], budget=0.05, provider=provider)
+        fallback_seconds = time.perf_counter() - started
+    finally:
+        server.shutdown()
+
+    return {
+        "docs": len(requests),
+        "stub_delay_ms": delay * 1000,
+        "http_requests": http_requests,
+        "cold_ms": round(cold_seconds * 1000, 3),
+        "unbatched_estimate_ms": round(len(requests) * delay * 1000, 3),
+        "cached_ms": round(cached_seconds * 1000, 3),
+        "budget_fallback_ms": round(fallback_seconds * 1000, 3),
+        "docs_per_sec": round(len(requests) / cold_seconds, 2),
+    }
+
+
+def _app_test():
+    from streamlit.testing.v1 import AppTest
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    return AppTest.from_file(os.path.join(repo_dir, "app.py"), default_timeout=120)
+
+
+_COLD_START_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+sys.path.insert(0, sys.argv[2])
+import tracing
+tracing.enable()
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+imported = time.perf_counter()
+app.run()
+print(json.dumps({
+    "import": imported - started,
+    "script": tracing.summary()["app.script_run"]["max_seconds"],
+    "heavy_modules": sorted(m for m in ("reportlab", "pdf2image", "PIL.Image") if m in sys.modules),
+}))
+"""
+
+
+def case_app_cold_start(args):
+    """
+    First script run of the Streamlit app, each sample in a fresh interpreter
+
+    The script time comes from the app's own "app.script_run" trace, because
+    AppTest's wall time is dominated by its polling interval.
+    """
+    try:
+        import streamlit  # noqa: F401
+    except ImportError:
+        return {"skipped": "streamlit is not installed"}
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(min(args.iterations, 5)):
+        output = subprocess.run(
+            [sys.executable, "-c", _COLD_START_SCRIPT, os.path.join(repo_dir, "app.py"), repo_dir],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, text=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    result = summarize([sample["script"] for sample in samples])
+    result["import_ms"] = round(statistics.median(sample["import"] for sample in samples) * 1000, 3)
+    result["heavy_modules_loaded"] = samples[0]["heavy_modules"]
+    return result
+
+
+def case_app_rerun(args):
+    """
+    Full script reruns triggered by a widget interaction, after a warm-up run
+    """
+    try:
+        app = _app_test()
+    except ImportError:
+        return {"skipped": "streamlit is not installed"}
+    import tracing
+
+    tracing.enable()
+    app.run()
+    tracing.reset()
+
+    for index in range(args.iterations):
+        app.text_input(key="history_query").set_value(f"client {index}")
+        app.run()
+
+    stats = tracing.summary()["app.script_run"]
+    return {
+        "iterations": stats["count"],
+        "p50_ms": round(stats["p50_seconds"] * 1000, 3),
+        "p95_ms": round(stats["p95_seconds"] * 1000, 3),
+        "docs_per_sec": round(stats["count"] / stats["total_seconds"], 2),
+    }
+
+
+CASES = {
+    "numbering": case_numbering,
+    "pdf_income": case_pdf_income,
+    "pdf_expense": case_pdf_expense,
+    "pdf_income_notes": case_pdf_income_notes,
+    "pdf_income_logo": case_pdf_income_logo,
+    "pdf_income_logo_notes": case_pdf_income_logo_notes,
+    "pdf_regenerate": case_pdf_regenerate,
+    "pdf_size": case_pdf_size,
+    "stylesheet": case_stylesheet,
+    "raster_72dpi": case_raster_72dpi,
+    "raster_150dpi": case_raster_150dpi,
+    "raster_300dpi": case_raster_300dpi,
+    "end_to_end_single": case_end_to_end_single,
+    "end_to_end_1000": case_end_to_end_1000,
+    "statement": case_statement,
+    "batch_pipeline": case_batch_pipeline,
+    "descriptions": case_descriptions,
+    "app_cold_start": case_app_cold_start,
+    "app_rerun": case_app_rerun,
+}
+
+
+def _run_case_in_child(name, args, repo_dir, queue):
+    sys.path.insert(0, repo_dir)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.makedirs("data", exist_ok=True)
+        try:
+            result = CASES[name](args)
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+        usage_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        os.chdir(repo_dir)
+
+    # ru_maxrss is reported in KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    result["peak_rss_mb"] = round(usage_self * scale / (1024 * 1024), 1)
+    if usage_children:
+        result["peak_child_rss_mb"] = round(usage_children * scale / (1024 * 1024), 1)
+    queue.put(result)
+
+
+def run_case(name, args):
+    """
+    Run one case in a fresh process so its peak RSS is measured on its own
+
+    Returns:
+        dict: The case result
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    process = context.Process(target=_run_case_in_child, args=(name, args, repo_dir, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def environment():
+    """
+    Describe the machine and commit the results were produced on
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline):
+    """
+    Print p50 and docs/sec changes against an earlier JSON report
+    """
+    print(f"\nCompared with {baseline['environment'].get('commit')}:")
+    for name, result in results["cases"].items():
+        before = baseline["cases"].get(name)
+        if not before or "p50_ms" not in result or "p50_ms" not in before:
+            continue
+        p50_change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0.0
+        print(f"  {name:<24} p50 {before['p50_ms']:>9.3f} -> {result['p50_ms']:>9.3f} ms ({p50_change:+.1f}%)  "
+              f"docs/sec {before['docs_per_sec']} -> {result['docs_per_sec']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark invoice generation")
+    parser.add_argument("--iterations", type=int, default=50, help="Calls per benchmark case")
+    parser.add_argument("--docs", type=int, default=1000, help="Documents in the bulk end-to-end case")
+    parser.add_argument("--bulk-jpg", action="store_true", help="Rasterize in the bulk end-to-end case too")
+    parser.add_argument("--statement-size", type=int, default=30, help="Transactions in the statement case")
+    parser.add_argument("--cases", default=None, help=f"Comma-separated subset of: {', '.join(CASES)}")
+    parser.add_argument("--output", default=None, help="Write the JSON results to this file")
+    parser.add_argument("--compare", default=None, help="Earlier JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    names = args.cases.split(",") if args.cases else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(unknown)}")
+
+    results = {"environment": environment(), "cases": {}}
+    for name in names:
+        result = run_case(name, args)
+        results["cases"][name] = result
+        if "skipped" in result or "error" in result:
+            print(f"{name:<24} {result.get('skipped') or result.get('error')}")
+        else:
+            print(f"{name:<24} p50 {result.get('p50_ms', '-'):>9} ms  p95 {result.get('p95_ms', '-'):>9} ms  "
+                  f"{result.get('docs_per_sec', '-'):>8} docs/sec  peak RSS {result['peak_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+"""
+Catalog of generated PDFs and JPGs
+
+Every rendered document is recorded with its number, entity, type, date,
+file paths, sizes and content hashes, so lookups such as "all invoices for X
+in May" are an indexed query instead of a directory walk. Files generated
+before the catalog existed can be added with one backfill scan.
+"""
+import datetime
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+# Path to the catalog database
+CATALOG_FILE = "data/catalog.db"
+
+# Directories scanned by backfill: the repo root (top level only) and output/ (recursively)
+SCAN_ROOTS = ((".", False), ("output", True))
+
+# e.g. invoice_INV001_20250519.pdf, invoice_INV001_20250519_Jane_Doe.jpg,
+# statement_STM-20250531-001_20250531.pdf
+_FILENAME_PATTERN = re.compile(
+    r"^(invoice|receipt|statement)_(.+?)_(\d{8})(?:_(.+))?\.(pdf|jpg)$",
+    re.IGNORECASE
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    document_type TEXT NOT NULL,
+    document_number TEXT NOT NULL COLLATE NOCASE,
+    transaction_type TEXT,
+    entity_name TEXT COLLATE NOCASE,
+    date TEXT NOT NULL,
+    amount REAL,
+    currency TEXT,
+    pdf_path TEXT NOT NULL UNIQUE,
+    pdf_size INTEGER,
+    pdf_sha256 TEXT,
+    jpg_path TEXT,
+    jpg_size INTEGER,
+    jpg_sha256 TEXT,
+    source TEXT NOT NULL DEFAULT 'generated',
+    recorded_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_artifacts_entity_date ON artifacts (entity_name, date);
+CREATE INDEX IF NOT EXISTS idx_artifacts_date ON artifacts (date);
+CREATE INDEX IF NOT EXISTS idx_artifacts_number ON artifacts (document_number);
+CREATE INDEX IF NOT EXISTS idx_artifacts_pdf_sha256 ON artifacts (pdf_sha256);
+"""
+
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+
+def _connect():
+    """
+    Open a connection to the catalog, creating the schema on first use
+    """
+    os.makedirs(os.path.dirname(CATALOG_FILE), exist_ok=True)
+    connection = sqlite3.connect(CATALOG_FILE, timeout=30)
+    connection.row_factory = sqlite3.Row
+
+    if CATALOG_FILE not in _initialized_paths:
+        with _init_lock:
+            if CATALOG_FILE not in _initialized_paths:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(_SCHEMA)
+                _initialized_paths.add(CATALOG_FILE)
+    return connection
+
+
+def _file_facts(path, data=None):
+    """
+    Size and SHA-256 of an artifact, from its bytes if already in memory
+    """
+    if path is None:
+        return None, None
+    if data is None:
+        if not os.path.exists(path):
+            return None, None
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+                size += len(block)
+        return size, digest.hexdigest()
+    return len(data), hashlib.sha256(data).hexdigest()
+
+
+_UPSERT = """
+INSERT INTO artifacts
+    (document_type, document_number, transaction_type, entity_name, date, amount, currency,
+     pdf_path, pdf_size, pdf_sha256, jpg_path, jpg_size, jpg_sha256, source)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (pdf_path) DO UPDATE SET
+    document_type = excluded.document_type,
+    document_number = excluded.document_number,
+    transaction_type = COALESCE(excluded.transaction_type, transaction_type),
+    entity_name = COALESCE(excluded.entity_name, entity_name),
+    date = excluded.date,
+    amount = COALESCE(excluded.amount, amount),
+    currency = COALESCE(excluded.currency, currency),
+    pdf_size = excluded.pdf_size,
+    pdf_sha256 = excluded.pdf_sha256,
+    jpg_path = COALESCE(excluded.jpg_path, jpg_path),
+    jpg_size = COALESCE(excluded.jpg_size, jpg_size),
+    jpg_sha256 = COALESCE(excluded.jpg_sha256, jpg_sha256),
+    recorded_at = datetime('now')
+"""
+
+
+def record_artifact(document_type, document_number, date, pdf_path, pdf_data=None,
+                    jpg_path=None, jpg_data=None, transaction_type=None, entity_name=None,
+                    amount=None, currency=None, source="generated"):
+    """
+    Add or update the catalog entry for a PDF
+
+    Args:
+        document_type (str): "Invoice", "Receipt" or "Statement"
+        document_number (str): Formatted number, e.g. "INV001"
+        date (date): Document date
+        pdf_path (str): Where the PDF was written
+        pdf_data (bytes, optional): The PDF bytes; read from pdf_path if omitted
+        jpg_path (str, optional): Where the JPG was written
+        jpg_data (bytes, optional): The JPG bytes; read from jpg_path if omitted
+        transaction_type (str, optional): "Income" or "Expense"
+        entity_name (str, optional): Name of the person or entity
+        amount (float, optional): Amount in the document currency
+        currency (str, optional): "GBP" or "USD"
+        source (str, optional): "generated" or "backfill"
+    """
+    pdf_size, pdf_sha256 = _file_facts(pdf_path, pdf_data)
+    jpg_size, jpg_sha256 = _file_facts(jpg_path, jpg_data)
+
+    connection = _connect()
+    try:
+        with connection:
+            connection.execute(_UPSERT, (
+                document_type, document_number, transaction_type, entity_name,
+                date.isoformat(), amount, currency,
+                os.path.normpath(pdf_path), pdf_size, pdf_sha256,
+                os.path.normpath(jpg_path) if jpg_path else None, jpg_size, jpg_sha256,
+                source
+            ))
+    finally:
+        connection.close()
+
+
+def search_artifacts(query=None, document_type=None, start_date=None, end_date=None, limit=200):
+    """
+    Find catalogued documents, newest first
+
+    Args:
+        query (str, optional): Prefix of the entity name or document number
+            (case-insensitive)
+        document_type (str, optional): Only this document type
+        start_date (date, optional): Only on or after this date
+        end_date (date, optional): Only on or before this date
+        limit (int, optional): Maximum number of rows. Defaults to 200.
+
+    Returns:
+        list: One dict per document
+    """
+    sql = "SELECT * FROM artifacts WHERE 1 = 1"
+    params = []
+    if query:
+        # Prefix matches on NOCASE columns can use the indexes
+        pattern = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        sql += " AND (entity_name LIKE ? ESCAPE '\\' OR document_number LIKE ? ESCAPE '\\')"
+        params += [pattern, pattern]
+    if document_type:
+        sql += " AND document_type = ?"
+        params.append(document_type)
+    if start_date:
+        sql += " AND date >= ?"
+        params.append(start_date.isoformat())
+    if end_date:
+        sql += " AND date <= ?"
+        params.append(end_date.isoformat())
+    sql += " ORDER BY date DESC, id DESC LIMIT ?"
+    params.append(limit)
+
+    connection = _connect()
+    try:
+        return [dict(row) for row in connection.execute(sql, params)]
+    finally:
+        connection.close()
+
+
+def list_artifacts():
+    """
+    Every catalogued document, oldest first
+
+    Returns:
+        list: One dict per document
+    """
+    connection = _connect()
+    try:
+        return [dict(row) for row in connection.execute("SELECT * FROM artifacts ORDER BY date, id")]
+    finally:
+        connection.close()
+
+
+def move_artifact(pdf_path, new_pdf_path, new_jpg_path=None):
+    """
+    Point a catalog entry at the new location of its files
+
+    Args:
+        pdf_path (str): Current PDF path, as stored in the catalog
+        new_pdf_path (str): New PDF path or bundle reference
+        new_jpg_path (str, optional): New JPG path or bundle reference
+    """
+    connection = _connect()
+    try:
+        with connection:
+            connection.execute(
+                "UPDATE artifacts SET pdf_path = ?, jpg_path = COALESCE(?, jpg_path) WHERE pdf_path = ?",
+                (new_pdf_path, new_jpg_path, pdf_path)
+            )
+    finally:
+        connection.close()
+
+
+def remove_artifact(pdf_path):
+    """
+    Drop the catalog entry for a PDF, e.g. a duplicate copy that was deleted
+    """
+    connection = _connect()
+    try:
+        with connection:
+            connection.execute("DELETE FROM artifacts WHERE pdf_path = ?", (pdf_path,))
+    finally:
+        connection.close()
+
+
+def catalog_stats():
+    """
+    Count catalogued documents
+
+    Returns:
+        dict: documents, with_jpg and total_bytes
+    """
+    connection = _connect()
+    try:
+        row = connection.execute(
+            """
+            SELECT COUNT(*) AS documents,
+                   COUNT(jpg_path) AS with_jpg,
+                   COALESCE(SUM(pdf_size), 0) + COALESCE(SUM(jpg_size), 0) AS total_bytes
+            FROM artifacts
+            """
+        ).fetchone()
+    finally:
+        connection.close()
+    return dict(row)
+
+
+def _scan(roots):
+    """
+    Yield (path, match, folder name) for every conventionally named artifact
+    """
+    for root, recursive in roots:
+        if not os.path.isdir(root):
+            continue
+        if recursive:
+            walker = os.walk(root)
+        else:
+            walker = [(root, [], [entry.name for entry in os.scandir(root) if entry.is_file()])]
+        for directory, _, files in walker:
+            for name in files:
+                match = _FILENAME_PATTERN.match(name)
+                if match:
+                    yield os.path.normpath(os.path.join(directory, name)), match, os.path.basename(directory)
+
+
+def backfill(roots=SCAN_ROOTS):
+    """
+    Catalog documents that were generated before the catalog existed
+
+    Details come from the filename conventions: the document type, number and
+    date from the name, the entity from the JPG name and Income/Expense from
+    the JPG's folder. Files already catalogued with the same size are skipped.
+
+    Args:
+        roots (tuple, optional): (directory, recursive) pairs to scan
+
+    Returns:
+        dict: scanned, added and skipped PDF counts
+    """
+    pdfs = []
+    jpgs = {}
+    for path, match, folder in _scan(roots):
+        kind, number, date_text, suffix, extension = match.groups()
+        key = (kind.lower(), number.upper(), date_text)
+        if extension.lower() == "pdf":
+            pdfs.append((path, key))
+        else:
+            transaction_type = None
+            if folder.lower().startswith("income_"):
+                transaction_type = "Income"
+            elif folder.lower().startswith("expense_"):
+                transaction_type = "Expense"
+            entity_name = suffix.replace("_", " ") if suffix else None
+            jpgs[key] = (path, entity_name, transaction_type)
+
+    connection = _connect()
+    try:
+        known = {row["pdf_path"]: row["pdf_size"]
+                 for row in connection.execute("SELECT pdf_path, pdf_size FROM artifacts")}
+    finally:
+        connection.close()
+
+    added = skipped = 0
+    for path, (kind, number, date_text) in pdfs:
+        if known.get(path) == os.path.getsize(path):
+            skipped += 1
+            continue
+        jpg_path, entity_name, transaction_type = jpgs.get((kind, number, date_text), (None, None, None))
+        record_artifact(
+            document_type=kind.capitalize(),
+            document_number=number,
+            date=datetime.datetime.strptime(date_text, "%Y%m%d").date(),
+            pdf_path=path,
+            jpg_path=jpg_path,
+            transaction_type=transaction_type,
+            entity_name=entity_name,
+            source="backfill"
+        )
+        added += 1
+
+    return {"scanned": len(pdfs), "added": added, "skipped": skipped}
+
+
+if __name__ == "__main__":
+    print(backfill())
@@ -0,0 +1,29 @@
+"""
+Company details printed on every invoice and receipt
+"""
+
+COMPANY_NAME = "UPLOAD FOR SOFTWARE LTD"
+COMPANY_ADDRESS = "71-75 Shelton Street, Covent Garden, London, WC2H 9JQ, United Kingdom"
+COMPANY_EMAIL = "Support@uploadforsoftware.com"
+COMPANY_PHONE = ""  # No phone per user request
+COMPANY_WEBSITE = "uploadforsoftware.com"
+COMPANY_NUMBER = "16009190"
+COMPANY_VAT = ""  # No VAT per user request
+
+
+def company_kwargs():
+    """
+    Company details as keyword arguments for generate_pdf
+
+    Returns:
+        dict: company_* keyword arguments
+    """
+    return {
+        "company_name": COMPANY_NAME,
+        "company_address": COMPANY_ADDRESS,
+        "company_email": COMPANY_EMAIL,
+        "company_phone": COMPANY_PHONE,
+        "company_website": COMPANY_WEBSITE,
+        "company_number": COMPANY_NUMBER,
+        "company_vat": COMPANY_VAT,
+    }
@@ -0,0 +1,179 @@
+"""
+Disk-backed cache of model-written project descriptions
+
+Entries are keyed by provider, entity and context, expire after a TTL and
+are trimmed least recently used first once there are too many, so repeat
+clients get an instant answer and the provider is only asked about new ones.
+The cache is a SQLite file, shared by the app and batch runs.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Path to the cache database
+CACHE_FILE = "data/descriptions.db"
+
+# Seconds a description stays valid
+TTL_SECONDS = 30 * 24 * 3600
+
+# Entries kept before the least recently used are dropped
+MAX_ENTRIES = 10000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS descriptions (
+    key TEXT PRIMARY KEY,
+    description TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_descriptions_used_at ON descriptions (used_at);
+"""
+
+
+def cache_key(provider, entity_name, context=None):
+    """
+    Hash a description request into a cache key
+
+    Entity names are compared ignoring case and surrounding whitespace.
+
+    Args:
+        provider (str): Provider name, including the model
+        entity_name (str): Client the document is for
+        context (str, optional): Anything else the description depends on
+
+    Returns:
+        str: Hex digest
+    """
+    payload = json.dumps([provider, (entity_name or "").strip().casefold(), context or ""])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DescriptionCache:
+    """
+    TTL and LRU bounded map from cache key to description
+
+    Args:
+        path (str, optional): SQLite file
+        ttl (float, optional): Seconds before an entry expires
+        max_entries (int, optional): Entries kept before trimming
+    """
+
+    def __init__(self, path=CACHE_FILE, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.executescript(_SCHEMA)
+                    self._initialized = True
+        return connection
+
+    def get_many(self, keys):
+        """
+        Look up several keys at once
+
+        Returns:
+            dict: key -> description for every fresh entry found
+        """
+        if not keys:
+            return {}
+        now = time.time()
+        placeholders = ",".join("?" * len(keys))
+        connection = self._connect()
+        try:
+            with connection:
+                found = dict(connection.execute(
+                    f"SELECT key, description FROM descriptions WHERE key IN ({placeholders}) AND created_at > ?",
+                    (*keys, now - self.ttl)
+                ).fetchall())
+                if found:
+                    connection.executemany(
+                        "UPDATE descriptions SET used_at = ? WHERE key = ?",
+                        [(now, key) for key in found]
+                    )
+        finally:
+            connection.close()
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def get(self, key):
+        """
+        Return the description for key, or None if missing or expired
+        """
+        return self.get_many([key]).get(key)
+
+    def put_many(self, entries):
+        """
+        Store descriptions and trim the cache to max_entries
+
+        Args:
+            entries (dict): key -> description
+        """
+        if not entries:
+            return
+        now = time.time()
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO descriptions (key, description, created_at, used_at) VALUES (?, ?, ?, ?)",
+                    [(key, description, now, now) for key, description in entries.items()]
+                )
+                connection.execute("DELETE FROM descriptions WHERE created_at <= ?", (now - self.ttl,))
+                connection.execute(
+                    "DELETE FROM descriptions WHERE key IN "
+                    "(SELECT key FROM descriptions ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+        finally:
+            connection.close()
+
+    def put(self, key, description):
+        self.put_many({key: description})
+
+    def stats(self):
+        """
+        Entry count and hit rate
+
+        Returns:
+            dict: entries, hits and misses
+        """
+        connection = self._connect()
+        try:
+            entries = connection.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+        finally:
+            connection.close()
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_description_cache():
+    """
+    Return the process-wide description cache
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DescriptionCache()
+    return _cache
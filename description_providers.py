@@ -0,0 +1,245 @@
+"""
+Sources of project descriptions for invoices and receipts
+
+A provider turns a list of {"entity": ..., "context": ...} items into one
+description per item. Four are available, picked with DESCRIPTION_PROVIDER:
+
+    random  (default) picks from the built-in lists, no network
+    openai  OpenAI chat completions (OPENAI_API_KEY)
+    gemini  Gemini through its OpenAI-compatible endpoint (GEMINI_API_KEY)
+    stub    the local stub server in description_stub_server.py, for tests
+
+The model-backed providers send several items per request and run requests
+concurrently, so a bulk run pays for a few round trips instead of one per row.
+"""
+import asyncio
+import json
+import os
+import random
+import urllib.request
+
+# Environment variables selecting the provider and model
+PROVIDER_ENV = "DESCRIPTION_PROVIDER"
+MODEL_ENV = "DESCRIPTION_MODEL"
+STUB_URL_ENV = "DESCRIPTION_STUB_URL"
+
+# Where description_stub_server.py listens by default
+DEFAULT_STUB_URL = "http://127.0.0.1:8765/v1"
+
+# Items sent in one chat completion request
+BATCH_SIZE = 10
+
+# Requests in flight at once during a bulk run
+MAX_CONCURRENT_REQUESTS = 4
+
+# Seconds before a single HTTP request is abandoned
+REQUEST_TIMEOUT = 30
+
+# Provider name -> (base URL, API key variable, default model)
+ENDPOINTS = {
+    "openai": ("https://api.openai.com/v1", "OPENAI_API_KEY", "gpt-4o-mini"),
+    "gemini": ("https://generativelanguage.googleapis.com/v1beta/openai", "GEMINI_API_KEY", "gemini-2.0-flash"),
+}
+
+SYSTEM_PROMPT = (
+    "You write invoice line descriptions for a software development company. "
+    "For each item, describe one specific software project the client commissioned, "
+    "including a product name, in English and in at most 12 words. "
+    'Reply with a JSON object {"descriptions": [...]} holding one string per item, in the same order.'
+)
+
+# Software project descriptions
+SOFTWARE_DESCRIPTIONS = [
+    "Development of custom inventory management system",
+    "Mobile application development for customer engagement",
+    "Web portal implementation for client management",
+    "E-commerce platform development with payment integration",
+    "Business intelligence dashboard implementation",
+    "Custom CRM system development and integration",
+    "API development for third-party service integration",
+    "Software maintenance and performance optimization",
+    "Legacy system modernization and migration",
+    "Cloud migration and infrastructure setup",
+    "Enterprise resource planning system implementation",
+    "Customer service ticketing system development",
+    "Accounting software customization",
+    "HR management system development",
+    "E-learning platform development and integration",
+    "Real-time messaging application development",
+    "Project management software implementation",
+    "Data visualization dashboard development",
+    "Automated reporting system implementation",
+    "Membership management portal development",
+    "Online booking system implementation",
+    "Fleet management software development",
+    "Restaurant management system implementation",
+    "Inventory tracking software development",
+    "Point of sale system implementation"
+]
+
+# Product/System names
+PRODUCT_NAMES = [
+    "ProAccess",
+    "SmartFlow",
+    "DataVista",
+    "NexusCore",
+    "OmniTrack",
+    "InteliServe",
+    "PrimeSoft",
+    "MetaLogic",
+    "OptiSphere",
+    "VisiTech",
+    "SyncWave",
+    "PrecisionPro",
+    "TotalSphere",
+    "EnterLogic",
+    "MaxiTech",
+    "PowerPortal",
+    "SmartPulse",
+    "EliteServe",
+    "SyncMatrix",
+    "TechEdge"
+]
+
+
+def random_description():
+    """
+    Pick a project description and product name from the built-in lists
+
+    Returns:
+        str: e.g. "Online booking system implementation - SyncWave System"
+    """
+    return random.choice(SOFTWARE_DESCRIPTIONS) + " - " + random.choice(PRODUCT_NAMES) + " System"
+
+
+class DescriptionProvider:
+    """
+    Base class for description sources
+
+    Subclasses implement describe_batch(). cacheable is False for providers
+    whose output is cheap and meant to vary on every call.
+    """
+
+    name = "base"
+    cacheable = True
+
+    async def describe_batch(self, items):
+        """
+        Describe a small batch of items
+
+        Args:
+            items (list): {"entity": str, "context": str} dicts
+
+        Returns:
+            list: One description per item, in order
+
+        Raises:
+            Exception: If the batch could not be described
+        """
+        raise NotImplementedError
+
+    async def describe_many(self, items, batch_size=BATCH_SIZE, concurrency=MAX_CONCURRENT_REQUESTS):
+        """
+        Describe any number of items in concurrent batches
+
+        Returns:
+            list: One description per item, or None where its batch failed
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        chunks = [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+
+        async def run(chunk):
+            async with semaphore:
+                return await self.describe_batch(chunk)
+
+        results = await asyncio.gather(*(run(chunk) for chunk in chunks), return_exceptions=True)
+        descriptions = []
+        for chunk, result in zip(chunks, results):
+            descriptions.extend([None] * len(chunk) if isinstance(result, BaseException) else result)
+        return descriptions
+
+
+class RandomProvider(DescriptionProvider):
+    """
+    The built-in lists; instant and never fails
+    """
+
+    name = "random"
+    cacheable = False
+
+    async def describe_batch(self, items):
+        return [random_description() for _ in items]
+
+
+class ChatCompletionsProvider(DescriptionProvider):
+    """
+    Any OpenAI-compatible /chat/completions endpoint
+
+    Args:
+        name (str): Provider name, part of the cache key
+        base_url (str): API root, e.g. https://api.openai.com/v1
+        api_key (str): Bearer token
+        model (str): Model name
+    """
+
+    def __init__(self, name, base_url, api_key, model):
+        self.name = f"{name}:{model}"
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+
+    def _post(self, payload):
+        request = urllib.request.Request(
+            f"{self.base_url}/chat/completions",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"},
+        )
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            return json.load(response)
+
+    async def describe_batch(self, items):
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": json.dumps({"items": items}, ensure_ascii=False)},
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.7,
+        }
+        # urllib blocks, so each request waits in a thread and batches overlap
+        response = await asyncio.to_thread(self._post, payload)
+        content = response["choices"][0]["message"]["content"]
+        descriptions = json.loads(content)["descriptions"]
+        if len(descriptions) != len(items) or not all(isinstance(d, str) and d.strip() for d in descriptions):
+            raise ValueError(f"Expected {len(items)} descriptions, got {content[:200]!r}")
+        return [" ".join(d.split()) for d in descriptions]
+
+
+def get_provider(name=None):
+    """
+    Build the provider selected by name or by DESCRIPTION_PROVIDER
+
+    A model provider without an API key falls back to the random provider.
+
+    Args:
+        name (str, optional): "random", "openai", "gemini" or "stub"
+
+    Returns:
+        DescriptionProvider: The provider
+
+    Raises:
+        ValueError: If the name is unknown
+    """
+    name = (name or os.environ.get(PROVIDER_ENV) or "random").lower()
+    if name == "random":
+        return RandomProvider()
+    if name == "stub":
+        return ChatCompletionsProvider("stub", os.environ.get(STUB_URL_ENV, DEFAULT_STUB_URL), "stub", "stub")
+    if name in ENDPOINTS:
+        base_url, key_env, model = ENDPOINTS[name]
+        api_key = os.environ.get(key_env)
+        if not api_key:
+            return RandomProvider()
+        return ChatCompletionsProvider(name, base_url, api_key, os.environ.get(MODEL_ENV, model))
+    raise ValueError(f"Unknown description provider: {name}")
@@ -0,0 +1,96 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions API
+
+Answers description requests from the built-in lists after an optional
+delay, and can fail a share of requests, so the provider, cache, batching and
+latency-budget fallback can be exercised without network access or API keys.
+
+Usage:
+    python description_stub_server.py --port 8765 --delay 0.5
+    DESCRIPTION_PROVIDER=stub streamlit run app.py
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from description_providers import random_description
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "DescriptionStub/1.0"
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self.server.requests += 1
+
+        time.sleep(self.server.delay)
+        if random.random() < self.server.fail_rate:
+            self.send_error(503, "Stub failure")
+            return
+
+        items = json.loads(body["messages"][-1]["content"])["items"]
+        content = json.dumps({"descriptions": [random_description() for _ in items]})
+        payload = json.dumps({
+            "object": "chat.completion",
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        }).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0, delay=0.0, fail_rate=0.0):
+    """
+    Run the stub in a background thread
+
+    Args:
+        port (int, optional): Port to listen on; 0 picks a free one
+        delay (float, optional): Seconds to wait before each answer
+        fail_rate (float, optional): Share of requests answered with HTTP 503
+
+    Returns:
+        ThreadingHTTPServer: The server; its url attribute is the API root
+            to put in DESCRIPTION_STUB_URL, and shutdown() stops it
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.fail_rate = fail_rate
+    server.requests = 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, name="description_stub", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve stub project descriptions over the chat completions API")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests to fail with HTTP 503")
+    args = parser.parse_args(argv)
+
+    server = start_stub_server(args.port, args.delay, args.fail_rate)
+    print(f"Serving stub descriptions at {server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Single-pass generation of a document's PDF and JPG artifacts
+
+The PDF is built in memory, rasterized from the same bytes and each artifact
+is written exactly once, so calls can run concurrently from a thread pool.
+"""
+import os
+
+from catalog import record_artifact
+from image_converter import get_preview_store, jpg_output_path, make_preview, rasterize_pdf
+from pdf_generator import pdf_filename, render_pdf, render_statement_pdf
+from render_cache import cache_key, get_render_cache
+import tracing
+from utils import atomic_write, join_inside
+
+
+def render_document(output_dir="output", with_jpg=True, raster_profile="print", use_cache=True,
+                    with_preview=True, reuse_layout=False, profile="standard", **fields):
+    """
+    Render a document and write its artifacts
+
+    Args:
+        output_dir (str, optional): Directory for the PDF. Defaults to "output".
+        with_jpg (bool, optional): Also rasterize the first page to JPG
+        raster_profile (str, optional): Key of image_converter.RASTER_PROFILES
+        use_cache (bool, optional): Serve identical requests from the render cache
+        with_preview (bool, optional): Also write a screen-resolution preview of the JPG
+        reuse_layout (bool, optional): Reuse the static sections of an earlier
+            render of the same document number (see pdf_generator.LayoutCache)
+        profile (str, optional): Key of pdf_generator.PDF_PROFILES
+        **fields: The keyword arguments accepted by pdf_generator.render_pdf
+
+    Returns:
+        dict: pdf_path, pdf_filename, pdf_data, jpg_path, jpg_data,
+            preview_path and preview_data (jpg_* and preview_* are None when
+            with_jpg is False or rasterization fails)
+    """
+    # The profile changes the bytes, so it is part of the render cache key
+    fields = dict(fields, profile=profile)
+    cache = get_render_cache() if use_cache else None
+    key = cache_key(fields) if use_cache else None
+
+    with tracing.span("pipeline.pdf", invoice_number=fields["invoice_number"]) as pdf_span:
+        pdf_data = cache.get(key, "pdf") if cache else None
+        pdf_span.set(cache_hit=pdf_data is not None)
+        if pdf_data is None:
+            pdf_data = render_pdf(reuse_layout=reuse_layout, **fields)
+            if cache:
+                cache.put(key, "pdf", pdf_data)
+
+    filename = pdf_filename(fields["document_type"], fields["invoice_number"], fields["date"])
+    pdf_path = join_inside(output_dir, filename)
+    with tracing.span("pipeline.write", artifact="pdf", bytes=len(pdf_data)):
+        atomic_write(pdf_path, pdf_data)
+
+    jpg_path = jpg_data = preview_path = preview_data = None
+    if with_jpg:
+        with tracing.span("pipeline.jpg", invoice_number=fields["invoice_number"]) as jpg_span:
+            jpg_data = cache.get(key, f"{raster_profile}.jpg") if cache else None
+            jpg_span.set(cache_hit=jpg_data is not None)
+            if jpg_data is None:
+                jpg_data = rasterize_pdf(pdf_data, pages=(1,), profile=raster_profile)[0]
+                if cache and jpg_data:
+                    cache.put(key, f"{raster_profile}.jpg", jpg_data)
+        if jpg_data:
+            jpg_path = jpg_output_path(
+                filename, fields["entity_name"], fields["transaction_type"], output_dir, fields["date"]
+            )
+            with tracing.span("pipeline.write", artifact="jpg", bytes=len(jpg_data)):
+                atomic_write(jpg_path, jpg_data)
+
+        if jpg_data and with_preview:
+            # Screen preview, downscaled from the JPG just rasterized
+            with tracing.span("pipeline.preview") as preview_span:
+                preview_data = cache.get(key, "preview.jpg") if cache else None
+                preview_span.set(cache_hit=preview_data is not None)
+                if preview_data is None:
+                    preview_data = make_preview(jpg_data)
+                    if cache:
+                        cache.put(key, "preview.jpg", preview_data)
+            with tracing.span("pipeline.write", artifact="preview", bytes=len(preview_data)):
+                preview_path = get_preview_store().put(jpg_path, preview_data)
+
+    with tracing.span("pipeline.catalog"):
+        record_artifact(
+            document_type=fields["document_type"],
+            document_number=fields["invoice_number"],
+            date=fields["date"],
+            pdf_path=pdf_path,
+            pdf_data=pdf_data,
+            jpg_path=jpg_path,
+            jpg_data=jpg_data,
+            transaction_type=fields["transaction_type"],
+            entity_name=fields["entity_name"],
+            amount=fields["amount"],
+            currency=fields.get("currency", "GBP")
+        )
+
+    return {
+        "pdf_path": pdf_path,
+        "pdf_filename": filename,
+        "pdf_data": pdf_data,
+        "jpg_path": jpg_path,
+        "jpg_data": jpg_data,
+        "preview_path": preview_path,
+        "preview_data": preview_data,
+    }
+
+
+def statement_filename(statement_number, statement_date):
+    """
+    Build the conventional filename for a statement
+
+    Returns:
+        str: e.g. "statement_STM-20250531-001_20250531.pdf"
+    """
+    return f"statement_{statement_number}_{statement_date.strftime('%Y%m%d')}.pdf"
+
+
+def render_statement(transactions, statement_number, statement_date, output_dir="output",
+                     include_details=True, profile="standard", **company):
+    """
+    Render a multi-transaction statement and write it once
+
+    Args:
+        transactions (list): Transaction dicts accepted by render_statement_pdf
+        statement_number (str): Number printed on the summary page
+        statement_date (date): Date printed on the summary page
+        output_dir (str, optional): Directory for the PDF. Defaults to "output".
+        include_details (bool, optional): Add a detail page per transaction
+        profile (str, optional): Key of pdf_generator.PDF_PROFILES
+        **company: The company_* keyword arguments of render_pdf
+
+    Returns:
+        dict: pdf_path, pdf_filename and pdf_data
+    """
+    pdf_data = render_statement_pdf(
+        transactions, statement_number, statement_date,
+        include_details=include_details, profile=profile, **company
+    )
+
+    filename = statement_filename(statement_number, statement_date)
+    pdf_path = join_inside(output_dir, filename)
+    atomic_write(pdf_path, pdf_data)
+
+    entities = {transaction["entity_name"] for transaction in transactions}
+    record_artifact(
+        document_type="Statement",
+        document_number=statement_number,
+        date=statement_date,
+        pdf_path=pdf_path,
+        pdf_data=pdf_data,
+        entity_name=entities.pop() if len(entities) == 1 else None
+    )
+
+    return {
+        "pdf_path": pdf_path,
+        "pdf_filename": filename,
+        "pdf_data": pdf_data,
+    }
@@ -1,36 +1,317 @@
+import io
 import os
 import datetime
-from pdf2image import convert_from_path
+import hashlib
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pdf2image import convert_from_path, convert_from_bytes
+from pdf2image.exceptions import PDFPageCountError, PDFSyntaxError
 from PIL import Image
+import tracing
+from utils import atomic_write
 
-def convert_pdf_to_jpg(pdf_path, entity_name=None, transaction_type=None):
+# Resolution and JPEG quality per output use
+RASTER_PROFILES = {
+    "preview": {"dpi": 100, "quality": 80},
+    "print": {"dpi": 300, "quality": 95},
+}
+
+# Screen preview derived from the print JPG: longest edge in pixels and JPEG quality
+PREVIEW_MAX_EDGE = 1200
+PREVIEW_QUALITY = 80
+
+# Directory for preview JPGs, kept out of the dated output folders
+PREVIEW_DIR = "data/previews"
+
+# Total size of the preview directory before the oldest previews are removed
+MAX_PREVIEW_BYTES = 64 * 1024 * 1024
+
+_pdftoppm_path = None
+
+
+def _find_pdftoppm():
     """
-    Convert a PDF file to JPG image and save it in a date-based folder
-    
+    Locate the poppler pdftoppm binary once per process
+
+    Returns:
+        str or None: Path to pdftoppm, or None if it is not on PATH
+    """
+    global _pdftoppm_path
+    if _pdftoppm_path is None:
+        _pdftoppm_path = shutil.which("pdftoppm") or ""
+    return _pdftoppm_path or None
+
+
+def _pdftoppm_page(pdftoppm, pdf_source, page, dpi, quality):
+    """
+    Render one page straight to JPEG with pdftoppm, reading the result from stdout
+    """
+    if isinstance(pdf_source, (bytes, bytearray)):
+        source_arg, stdin_data = "-", bytes(pdf_source)
+    else:
+        source_arg, stdin_data = pdf_source, None
+
+    command = [
+        pdftoppm, "-jpeg", "-jpegopt", f"quality={quality}",
+        "-r", str(dpi), "-f", str(page), "-l", str(page), "-singlefile",
+        source_arg,
+    ]
+    result = subprocess.run(command, input=stdin_data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return result.stdout
+
+
+def _pdf2image_render(pdf_source, page, dpi):
+    """
+    Render one page through pdf2image to a PIL image
+
+    Returns None when poppler cannot read the page, like pdftoppm; a
+    missing poppler install still raises.
+    """
+    try:
+        if isinstance(pdf_source, (bytes, bytearray)):
+            images = convert_from_bytes(pdf_source, dpi=dpi, first_page=page, last_page=page)
+        else:
+            images = convert_from_path(pdf_source, dpi=dpi, first_page=page, last_page=page)
+    except (PDFPageCountError, PDFSyntaxError):
+        return None
+    return images[0] if images else None
+
+
+def encode_jpeg(image, quality):
+    """
+    Encode a PIL image as JPEG bytes
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def rasterize_page(pdf_source, page=1, profile="print"):
+    """
+    Rasterize one page, leaving the JPEG encode to the caller where possible
+
+    pdftoppm encodes the JPEG itself, so its output is returned as bytes. The
+    pdf2image fallback returns the PIL image so a pipeline can encode it in
+    a separate stage with encode_jpeg.
+
     Args:
-        pdf_path (str): Path to the PDF file
+        pdf_source (str or bytes): Path to the PDF, or the PDF bytes
+        page (int, optional): 1-based page number. Defaults to 1.
+        profile (str, optional): Key of RASTER_PROFILES. Defaults to "print".
+
+    Returns:
+        bytes, PIL.Image.Image or None: JPEG bytes, an image still to be
+        encoded, or None if the page does not exist
+
+    Raises:
+        PDFInfoNotInstalledError: If poppler is not installed (from pdf2image)
+    """
+    settings = RASTER_PROFILES[profile]
+    pdftoppm = _find_pdftoppm()
+    with tracing.span("raster.page", page=page, dpi=settings["dpi"]) as page_span:
+        if pdftoppm:
+            try:
+                page_span.set(engine="pdftoppm")
+                return _pdftoppm_page(pdftoppm, pdf_source, page, settings["dpi"], settings["quality"]) or None
+            except subprocess.CalledProcessError:
+                pass
+        page_span.set(engine="pdf2image")
+        return _pdf2image_render(pdf_source, page, settings["dpi"])
+
+
+def rasterize_pdf(pdf_source, pages=(1,), profile="print"):
+    """
+    Render the requested PDF pages to JPEG bytes without temporary files
+
+    Only the listed pages are rasterized. When poppler's pdftoppm is on PATH
+    it encodes JPEGs directly and pages are rendered by parallel pdftoppm
+    processes; otherwise pdf2image and PIL are used.
+
+    Args:
+        pdf_source (str or bytes): Path to the PDF, or the PDF bytes
+        pages (iterable, optional): 1-based page numbers. Defaults to the first page.
+        profile (str, optional): Key of RASTER_PROFILES. Defaults to "print".
+
+    Returns:
+        list: JPEG bytes per requested page (None for pages that do not exist)
+
+    Raises:
+        PDFInfoNotInstalledError: If poppler is not installed (from pdf2image)
+    """
+    quality = RASTER_PROFILES[profile]["quality"]
+    pages = list(pages)
+
+    def render(page):
+        result = rasterize_page(pdf_source, page, profile)
+        return encode_jpeg(result, quality) if isinstance(result, Image.Image) else result
+
+    if len(pages) == 1:
+        return [render(pages[0])]
+
+    with ThreadPoolExecutor(max_workers=min(len(pages), os.cpu_count() or 1)) as executor:
+        return list(executor.map(render, pages))
+
+
+def make_preview(jpg_data, max_edge=PREVIEW_MAX_EDGE, quality=PREVIEW_QUALITY):
+    """
+    Derive a screen-resolution progressive JPEG from a rasterized page
+
+    The JPEG decoder is asked for a reduced-size decode (Image.draft), so the
+    full 300-DPI page is never expanded in memory, and the page is not
+    rasterized a second time.
+
+    Args:
+        jpg_data (bytes): The print JPG
+        max_edge (int, optional): Longest edge of the preview in pixels
+        quality (int, optional): JPEG quality of the preview
+
+    Returns:
+        bytes: The preview JPG
+    """
+    with Image.open(io.BytesIO(jpg_data)) as image:
+        image.draft("RGB", (max_edge, max_edge))
+        image = image.convert("RGB")
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+class PreviewStore:
+    """
+    Size-bounded directory of preview JPGs
+
+    Previews are only shown on screen and can be derived again from the
+    print JPG, so once the directory grows past its byte budget the least
+    recently written previews are removed, as render_cache.RenderCache does.
+    """
+
+    def __init__(self, preview_dir=PREVIEW_DIR, max_bytes=MAX_PREVIEW_BYTES):
+        self.preview_dir = preview_dir
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _entries(self):
+        try:
+            names = os.listdir(self.preview_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.startswith(".tmp_"):
+                continue
+            path = os.path.join(self.preview_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield path, stat.st_size, stat.st_mtime
+
+    def path(self, jpg_path):
+        """
+        Where the preview of a print JPG is stored
+
+        The name starts with a hash of the JPG's full path, so JPGs with the
+        same filename in different output directories get their own previews.
+
+        Returns:
+            str: Path under preview_dir
+        """
+        digest = hashlib.sha256(os.path.realpath(jpg_path).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.preview_dir, f"{digest}_{os.path.basename(jpg_path)}")
+
+    def put(self, jpg_path, data):
+        """
+        Write the preview for a print JPG, evicting old previews if over budget
+
+        Returns:
+            str: Path of the preview
+        """
+        path = self.path(jpg_path)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        atomic_write(path, data)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(data) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+        return path
+
+    def _evict(self):
+        # Called with the lock held; drop the oldest previews down to 90% of the budget
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        size = sum(entry[1] for entry in entries)
+        target = self.max_bytes * 0.9
+        for path, entry_size, _ in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            self.evictions += 1
+        self._size = size
+
+
+_preview_store = None
+_preview_store_lock = threading.Lock()
+
+
+def get_preview_store():
+    """
+    Get the process-wide PreviewStore
+
+    Returns:
+        PreviewStore: The shared store
+    """
+    global _preview_store
+    if _preview_store is None:
+        with _preview_store_lock:
+            if _preview_store is None:
+                _preview_store = PreviewStore()
+    return _preview_store
+
+
+def jpg_output_path(pdf_path, entity_name=None, transaction_type=None, output_dir="output", date=None):
+    """
+    Work out where the JPG for a PDF belongs, creating its date-based folder
+
+    Args:
+        pdf_path (str): Path or filename of the PDF
         entity_name (str, optional): Name of the person/entity to include in filename
         transaction_type (str, optional): Type of transaction (Income/Expense)
-        
+        output_dir (str, optional): Directory the dated folder is created in.
+            Defaults to "output".
+        date (date, optional): Document date the folder is named after.
+            Defaults to today.
+
     Returns:
-        str: Path to the JPG image
+        str: Path for the JPG image
     """
-    # Get current date for folder name
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    
+    folder_date = (date or datetime.date.today()).strftime("%Y-%m-%d")
+
     # Create folder name based on transaction type and date
     folder_prefix = "income" if transaction_type and transaction_type.lower() == "income" else "expense"
-    folder_name = f"{folder_prefix}_{today}"
-    
+    folder_name = f"{folder_prefix}_{folder_date}"
+
     # Create full folder path
-    folder_path = os.path.join("output", folder_name)
-    
+    folder_path = os.path.join(output_dir, folder_name)
+
     # Create the folder if it doesn't exist
     os.makedirs(folder_path, exist_ok=True)
-    
+
     # Extract base filename without extension and path
     base_filename = os.path.basename(pdf_path).replace('.pdf', '')
-    
+
     # Create output filename with entity name if provided
     if entity_name:
         # Clean entity name for filename (remove invalid characters)
@@ -41,16 +322,36 @@ def convert_pdf_to_jpg(pdf_path, entity_name=None, transaction_type=None):
         jpg_filename = f"{base_filename}_{clean_name}.jpg"
     else:
         jpg_filename = f"{base_filename}.jpg"
-    
+
     # Full path to the jpg file
-    jpg_path = os.path.join(folder_path, jpg_filename)
-    
-    # Convert PDF to image
-    images = convert_from_path(pdf_path, dpi=300)
-    
+    return os.path.join(folder_path, jpg_filename)
+
+
+def convert_pdf_to_jpg(pdf_path, entity_name=None, transaction_type=None, profile="print",
+                       output_dir="output", date=None):
+    """
+    Convert a PDF file to JPG image and save it in a date-based folder
+
+    Args:
+        pdf_path (str): Path to the PDF file
+        entity_name (str, optional): Name of the person/entity to include in filename
+        transaction_type (str, optional): Type of transaction (Income/Expense)
+        profile (str, optional): Key of RASTER_PROFILES. Defaults to "print".
+        output_dir (str, optional): Directory the dated folder is created in.
+            Defaults to "output".
+        date (date, optional): Document date the folder is named after.
+            Defaults to today.
+
+    Returns:
+        str: Path to the JPG image
+    """
+    # Rasterize only the first page
+    jpg_data = rasterize_pdf(pdf_path, pages=(1,), profile=profile)[0]
+
     # Save the first page as a JPG
-    if images:
-        images[0].save(jpg_path, 'JPEG', quality=95)
+    if jpg_data:
+        jpg_path = jpg_output_path(pdf_path, entity_name, transaction_type, output_dir, date)
+        atomic_write(jpg_path, jpg_data)
         return jpg_path
-    
-    return None
\ No newline at end of file
+
+    return None
@@ -1,61 +1,212 @@
 import json
 import os
 import datetime
+import re
+import threading
+from contextlib import contextmanager
+
+from number_index import get_number_index
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; fall back to the in-process lock only
+    fcntl = None
 
 # Path to store the invoice counter
 COUNTER_FILE = "data/invoice_counter.json"
 
-def get_next_invoice_number(document_type):
+# Lock file guarding read-modify-write cycles on COUNTER_FILE
+COUNTER_LOCK_FILE = "data/invoice_counter.lock"
+
+# An invoice or receipt number as printed, e.g. "INV007"
+INVOICE_NUMBER_PATTERN = re.compile(r"^(INV|REC)(\d+)$")
+
+# flock() serialises processes; this serialises threads within one process
+_counter_thread_lock = threading.Lock()
+
+
+def _default_counters():
+    return {
+        "Invoice": 0,
+        "Receipt": 0
+    }
+
+
+def _read_counters():
     """
-    Get the next invoice or receipt number in sequence
+    Read the counters from disk, falling back to zeroed counters
     """
-    # Create the data directory if it doesn't exist
-    os.makedirs(os.path.dirname(COUNTER_FILE), exist_ok=True)
-    
-    # Initialize or load the counter file
     if not os.path.exists(COUNTER_FILE):
-        counters = {
-            "Invoice": 0,
-            "Receipt": 0
-        }
-    else:
-        with open(COUNTER_FILE, 'r') as f:
-            try:
-                counters = json.load(f)
-            except json.JSONDecodeError:
-                counters = {
-                    "Invoice": 0,
-                    "Receipt": 0
-                }
-    
-    # Increment the counter for the specified document type
-    counters[document_type] += 1
-    
-    # Save the updated counter
-    with open(COUNTER_FILE, 'w') as f:
+        return _default_counters()
+    with open(COUNTER_FILE, 'r') as f:
+        try:
+            counters = json.load(f)
+        except json.JSONDecodeError:
+            return _default_counters()
+    for document_type, value in _default_counters().items():
+        counters.setdefault(document_type, value)
+    return counters
+
+
+def _write_counters(counters):
+    """
+    Atomically replace the counter file so readers never see a partial write
+    """
+    tmp_path = f"{COUNTER_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
         json.dump(counters, f)
-    
-    # Format the invoice number
-    prefix = "INV" if document_type == "Invoice" else "REC"
-    return f"{prefix}{counters[document_type]:03d}"
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, COUNTER_FILE)
 
-def get_current_counter(document_type):
+
+@contextmanager
+def _locked_counters():
     """
-    Get the current counter value without incrementing
+    Hold an exclusive lock on the counter store for a read-modify-write cycle
+
+    Yields:
+        dict: The current counters. Any changes are written back on exit.
     """
     # Create the data directory if it doesn't exist
     os.makedirs(os.path.dirname(COUNTER_FILE), exist_ok=True)
-    
-    # Initialize or load the counter file
-    if not os.path.exists(COUNTER_FILE):
-        return 0
-    else:
-        with open(COUNTER_FILE, 'r') as f:
+
+    with _counter_thread_lock:
+        with open(COUNTER_LOCK_FILE, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
             try:
-                counters = json.load(f)
-                return counters.get(document_type, 0)
-            except json.JSONDecodeError:
-                return 0
+                counters = _read_counters()
+                original = dict(counters)
+                yield counters
+                if counters != original:
+                    _write_counters(counters)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _number_index():
+    """
+    Return the issued-number index, seeding it from the counters on first use
+    """
+    index = get_number_index()
+    if not index.exists():
+        with _locked_counters() as counters:
+            index.seed(counters)
+    return index
+
+
+def get_next_invoice_number(document_type):
+    """
+    Get the next invoice or receipt number in sequence
+    """
+    return reserve_invoice_numbers(document_type, 1)[0]
+
+
+def reserve_invoice_numbers(document_type, count):
+    """
+    Atomically reserve a block of invoice or receipt numbers
+
+    Numbers above the counter that were already issued (e.g. forced by
+    hand) are skipped, so the block is consecutive unless it runs into one.
+
+    Args:
+        document_type (str): "Invoice" or "Receipt"
+        count (int): How many numbers to reserve
+
+    Returns:
+        list: The formatted numbers (e.g., ["INV004", "INV005"]) in order
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1")
+
+    index = _number_index()
+    with _locked_counters() as counters:
+        numbers = []
+        number = counters.get(document_type, 0)
+        while len(numbers) < count:
+            number = index.next_free(document_type, number + 1)
+            numbers.append(number)
+        counters[document_type] = numbers[-1]
+        index.mark(numbers, document_type)
+
+    return [format_invoice_number(number, document_type) for number in numbers]
+
+
+def claim_invoice_numbers(numbers, document_type):
+    """
+    Record numbers chosen by the caller as issued, refusing any already issued
+
+    Accepted numbers are recorded in the issued-number index and move the
+    counter up, as set_custom_invoice_number does, so they are never
+    reserved again.
+
+    Args:
+        numbers (list): Numeric parts of the chosen numbers
+        document_type (str): "Invoice" or "Receipt"
+
+    Returns:
+        list: The refused numbers, issued before or repeated in numbers
+    """
+    index = _number_index()
+    with _locked_counters() as counters:
+        accepted, refused = [], []
+        for number in numbers:
+            if number in accepted or index.contains(number, document_type):
+                refused.append(number)
+            else:
+                accepted.append(number)
+        if accepted:
+            counters[document_type] = max(counters.get(document_type, 0), max(accepted))
+            index.mark(accepted, document_type)
+    return refused
+
+
+def reserve_statement_numbers(count, statement_date):
+    """
+    Atomically reserve a block of statement numbers
+
+    Statements have their own counter, so numbers never repeat across runs,
+    even on the same day.
+
+    Args:
+        count (int): How many numbers to reserve
+        statement_date (date): Date printed in the numbers
+
+    Returns:
+        list: The statement numbers (e.g., ["STM-20250531-004"]) in order
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1")
+
+    with _locked_counters() as counters:
+        first = counters.get("Statement", 0) + 1
+        counters["Statement"] = first + count - 1
+
+    return [f"STM-{statement_date.strftime('%Y%m%d')}-{number:03d}" for number in range(first, first + count)]
+
+
+def reset_invoice_counters(start_number):
+    """
+    Reset every counter so that the next number issued is start_number
+
+    Args:
+        start_number (int): The first number to issue after the reset
+    """
+    with _locked_counters() as counters:
+        for document_type in _default_counters():
+            counters[document_type] = start_number - 1
+        # Numbers below the new start stay reserved; everything else is free again
+        get_number_index().clear(counters)
+
+
+def get_current_counter(document_type):
+    """
+    Get the current counter value without incrementing
+    """
+    # A plain read is safe: writers replace the file atomically
+    return _read_counters().get(document_type, 0)
 
 def check_invoice_number_exists(number, document_type):
     """
@@ -68,8 +219,33 @@ def check_invoice_number_exists(number, document_type):
     Returns:
         bool: True if the invoice number exists, False otherwise
     """
-    current_counter = get_current_counter(document_type)
-    return number <= current_counter
+    return _number_index().contains(number, document_type)
+
+
+def next_free_invoice_number(document_type, start=1):
+    """
+    Find the lowest number that has not been issued yet, including gaps
+    left below the counter
+
+    Args:
+        document_type (str): "Invoice" or "Receipt"
+        start (int, optional): Lowest number to consider. Defaults to 1.
+
+    Returns:
+        int: The numeric part of the first free number
+    """
+    return _number_index().next_free(document_type, start)
+
+
+def audit_invoice_numbers():
+    """
+    Report gaps and duplicates among the issued numbers
+
+    Returns:
+        dict: Per document type, the issued count, highest number, gaps,
+        duplicates ({number: extra issues}) and numbers issued above the counter
+    """
+    return _number_index().audit(_read_counters())
 
 def format_invoice_number(number, document_type):
     """
@@ -85,6 +261,26 @@ def format_invoice_number(number, document_type):
     prefix = "INV" if document_type == "Invoice" else "REC"
     return f"{prefix}{number:03d}"
 
+def parse_invoice_number(invoice_number, document_type):
+    """
+    Check a printed invoice or receipt number and extract its numeric part
+
+    Args:
+        invoice_number (str): e.g. "INV007"
+        document_type (str): "Invoice" or "Receipt"
+
+    Returns:
+        int: The numeric part
+
+    Raises:
+        ValueError: If the number is malformed or has the other type's prefix
+    """
+    match = INVOICE_NUMBER_PATTERN.match(invoice_number)
+    prefix = "INV" if document_type == "Invoice" else "REC"
+    if not match or match.group(1) != prefix:
+        raise ValueError(f"Invalid {document_type.lower()} number: {invoice_number!r} (expected e.g. {prefix}001)")
+    return int(match.group(2))
+
 def set_custom_invoice_number(number, document_type, force=False):
     """
     Set a custom invoice number for the specified document type
@@ -97,36 +293,16 @@ def set_custom_invoice_number(number, document_type, force=False):
     Returns:
         bool: True if successful, False if number already exists and force is False
     """
-    # Create the data directory if it doesn't exist
-    os.makedirs(os.path.dirname(COUNTER_FILE), exist_ok=True)
-    
-    # Initialize or load the counter file
-    if not os.path.exists(COUNTER_FILE):
-        counters = {
-            "Invoice": 0,
-            "Receipt": 0
-        }
-    else:
-        with open(COUNTER_FILE, 'r') as f:
-            try:
-                counters = json.load(f)
-            except json.JSONDecodeError:
-                counters = {
-                    "Invoice": 0,
-                    "Receipt": 0
-                }
-    
-    # Check if the number already exists and we're not forcing
-    if not force and number <= counters.get(document_type, 0):
-        return False
-    
-    # If we're forcing or the number is new, set it (but don't decrease the counter)
-    if number > counters.get(document_type, 0):
-        counters[document_type] = number
-        
-        # Save the updated counter
-        with open(COUNTER_FILE, 'w') as f:
-            json.dump(counters, f)
+    index = _number_index()
+    with _locked_counters() as counters:
+        # Check if the number already exists and we're not forcing
+        if not force and index.contains(number, document_type):
+            return False
+
+        # If we're forcing or the number is new, set it (but don't decrease the counter)
+        if number > counters.get(document_type, 0):
+            counters[document_type] = number
+        index.mark([number], document_type)
     
     return True
 
@@ -142,9 +318,14 @@ def force_invoice_number(number, document_type):
     Returns:
         str: The formatted invoice number
     """
-    # Just return the formatted number without updating the counter
-    prefix = "INV" if document_type == "Invoice" else "REC"
-    return f"{prefix}{number:03d}"
+    # Record the issue (as a duplicate if the number was used before); a number
+    # above the counter moves the counter up so it is not handed out again
+    index = _number_index()
+    with _locked_counters() as counters:
+        if number > counters.get(document_type, 0):
+            counters[document_type] = number
+        index.mark([number], document_type)
+    return format_invoice_number(number, document_type)
 
 def generate_invoice_text(transaction_type, entity_name, amount, date, description, company_name, currency="GBP"):
     """
@@ -0,0 +1,419 @@
+"""
+Headless HTTP service for generating invoices and receipts
+
+Other systems create documents with a JSON POST instead of driving the
+Streamlit UI. Rendering runs in a process pool behind the bounded
+RenderQueue, so the event loop only parses requests and streams files. When
+the queue is full a request is refused with 429 and a Retry-After header
+rather than queued without limit.
+
+    POST /documents              JSON row as accepted by batch_generator,
+                                 without invoice_number (the service numbers it)
+                                 -> 202 {"id", "status_url"}, or 429
+    GET  /documents/<id>         job state; invoice number and links when done
+                                 (jpg_url is null and jpg_error set if only
+                                 the JPG failed)
+    GET  /documents/<id>/pdf     the PDF, streamed
+    GET  /documents/<id>/jpg     the first page as JPG, streamed
+    GET  /health                 queue depth and latency
+
+InvoiceService is a plain ASGI application, and serve() is a small asyncio
+HTTP/1.1 server for it, so the service runs with the standard library alone.
+It has no authentication and listens on localhost by default.
+
+Usage:
+    python invoice_service.py --port 8080 --workers 4
+    python loadtest.py --url http://127.0.0.1:8080 --requests 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import http
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+from archive import BUNDLE_SEPARATOR, read_artifact
+from batch_generator import _document_fields, assign_numbers, normalize_row
+from document_pipeline import render_document
+from openai_helper import description_context, generate_smart_description
+from pdf_generator import PDF_PROFILES
+from render_queue import DONE, FAILED, QueueFullError, RenderQueue
+
+# Where the service writes its documents
+SERVICE_OUTPUT_DIR = os.path.join("output", "service")
+
+# Largest request body accepted
+MAX_BODY_BYTES = 64 * 1024
+
+# Size of each chunk when streaming an artifact
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Seconds suggested to clients refused with 429
+RETRY_AFTER_SECONDS = 1
+
+_CONTENT_TYPES = {"pdf": "application/pdf", "jpg": "image/jpeg"}
+
+
+def _init_worker():
+    # Ctrl+C reaches the whole process group; the service shuts the pool down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _render_in_worker(fields, output_dir, with_jpg):
+    """
+    Render one document; runs inside a worker process
+
+    Only the paths travel back to the service process, not the bytes. A
+    failed JPG does not fail the document: the PDF is returned with
+    jpg_error saying why there is no JPG.
+    """
+    jpg_error = None
+    try:
+        artifacts = render_document(output_dir=output_dir, with_jpg=with_jpg, with_preview=False, **fields)
+    except Exception as e:
+        if not with_jpg:
+            raise
+        jpg_error = f"{type(e).__name__}: {e}"
+        # The PDF comes from the render cache; if it was the PDF that failed this raises again
+        artifacts = render_document(output_dir=output_dir, with_jpg=False, with_preview=False, **fields)
+    if with_jpg and artifacts["jpg_path"] is None and jpg_error is None:
+        jpg_error = "The first page could not be rasterized"
+    return {"pdf_path": artifacts["pdf_path"], "jpg_path": artifacts["jpg_path"], "jpg_error": jpg_error}
+
+
+class InvoiceService:
+    """
+    ASGI application exposing the generate, status and download endpoints
+
+    Args:
+        output_dir (str, optional): Directory for generated PDFs
+        workers (int, optional): Render processes. Defaults to the CPU count.
+        max_pending (int, optional): Jobs queued or running before 429
+        with_jpg (bool, optional): Rasterize the first page of every document
+        profile (str, optional): Key of pdf_generator.PDF_PROFILES
+    """
+
+    def __init__(self, output_dir=SERVICE_OUTPUT_DIR, workers=None, max_pending=32, with_jpg=True,
+                 profile="standard"):
+        self.output_dir = output_dir
+        self.with_jpg = with_jpg
+        self.profile = profile
+        self.workers = workers or os.cpu_count() or 1
+        self.rejected = 0
+        # Forking would copy the event loop's and queue threads' locks into the
+        # workers in whatever state they are in; start them from a clean process
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context(start_method), initializer=_init_worker
+        )
+        # One thread per process: it numbers the row, then waits on the pool
+        self.queue = RenderQueue(max_workers=self.workers, max_pending=max_pending, history=10000)
+
+    def close(self):
+        self.queue.shutdown(wait=True)
+        self._pool.shutdown(wait=True)
+
+    def _generate(self, row):
+        """
+        Number, describe and render a validated row; runs on a queue thread
+
+        The number is taken only once the job runs, so refused or failed
+        admissions never use one up.
+        """
+        for _, error in assign_numbers([row]):
+            raise ValueError(error)
+        description = row["description"] or generate_smart_description(
+            row["entity_name"],
+            description_context(row["document_type"], row["transaction_type"], row["entity_type"])
+        )
+        fields = _document_fields(row, description, self.profile)
+        result = self._pool.submit(_render_in_worker, fields, self.output_dir, self.with_jpg).result()
+        result.update({"invoice_number": row["invoice_number"], "description": description})
+        return result
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+
+        method, parts = scope["method"], [part for part in scope["path"].split("/") if part]
+        if parts == ["documents"] and method == "POST":
+            await self._create(receive, send)
+        elif len(parts) == 2 and parts[0] == "documents" and method == "GET":
+            await self._status(parts[1], send)
+        elif len(parts) == 3 and parts[0] == "documents" and parts[2] in _CONTENT_TYPES and method in ("GET", "HEAD"):
+            await self._download(parts[1], parts[2], send, head=method == "HEAD")
+        elif parts == ["health"] and method == "GET":
+            await _send_json(send, 200, {**self.queue.stats(), "rejected": self.rejected})
+        else:
+            await _send_json(send, 404, {"error": "Not found"})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.to_thread(self.close)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _create(self, receive, send):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY_BYTES:
+                await _send_json(send, 413, {"error": "Request body too large"})
+                return
+            if not message.get("more_body"):
+                break
+
+        try:
+            payload = json.loads(body or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("Expected a JSON object")
+            # Every number is allocated here, so clients cannot reuse one or
+            # pick the filename the document is written to
+            if payload.get("invoice_number"):
+                raise ValueError("invoice_number is assigned by the service")
+            row = normalize_row(payload)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            await _send_json(send, 400, {"error": str(e)})
+            return
+
+        try:
+            job_id = self.queue.submit(self._generate, row)
+        except QueueFullError as e:
+            self.rejected += 1
+            await _send_json(send, 429, {"error": str(e)}, [(b"retry-after", str(RETRY_AFTER_SECONDS).encode())])
+            return
+
+        status_url = f"/documents/{job_id}"
+        await _send_json(send, 202, {"id": job_id, "status_url": status_url}, [(b"location", status_url.encode())])
+
+    async def _status(self, job_id, send):
+        job = self.queue.status(job_id)
+        if job is None:
+            await _send_json(send, 404, {"error": "Unknown job"})
+            return
+
+        payload = {
+            "id": job_id,
+            "state": job["state"],
+            "wait_seconds": round(job["wait_seconds"], 4),
+            "total_seconds": round(job["total_seconds"], 4),
+        }
+        if "position" in job:
+            payload["position"] = job["position"]
+        if job["state"] == FAILED:
+            payload["error"] = job["error"]
+        if job["state"] == DONE:
+            result = job["result"]
+            payload.update({
+                "invoice_number": result["invoice_number"],
+                "description": result["description"],
+                "pdf_url": f"/documents/{job_id}/pdf",
+                "jpg_url": f"/documents/{job_id}/jpg" if result["jpg_path"] else None,
+            })
+            if result["jpg_error"]:
+                payload["jpg_error"] = result["jpg_error"]
+        await _send_json(send, 200, payload)
+
+    async def _download(self, job_id, kind, send, head=False):
+        job = self.queue.status(job_id)
+        if job is None or job["state"] != DONE:
+            status, error = (404, "Unknown job") if job is None else (409, f"Job is {job['state']}")
+            await _send_json(send, status, {"error": error})
+            return
+
+        path = job["result"][f"{kind}_path"]
+        if not path:
+            await _send_json(send, 404, {"error": f"No {kind.upper()} for this document"})
+            return
+
+        headers = [
+            (b"content-type", _CONTENT_TYPES[kind].encode()),
+            (b"content-disposition", f'attachment; filename="{os.path.basename(path)}"'.encode()),
+        ]
+        if BUNDLE_SEPARATOR in path:
+            # Archived since it was generated: one read from the bundle
+            data = await asyncio.to_thread(read_artifact, path)
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": headers + [(b"content-length", str(len(data)).encode())]})
+            await send({"type": "http.response.body", "body": b"" if head else data})
+            return
+
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            await _send_json(send, 410, {"error": "The file has been removed"})
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": headers + [(b"content-length", str(size).encode())]})
+            if head:
+                await send({"type": "http.response.body", "body": b""})
+                return
+            while True:
+                chunk = await asyncio.to_thread(f.read, STREAM_CHUNK_BYTES)
+                more = len(chunk) == STREAM_CHUNK_BYTES
+                await send({"type": "http.response.body", "body": chunk, "more_body": more})
+                if not more:
+                    break
+
+
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                    *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _run_app(app, scope, body, writer, keep_alive):
+    """
+    Call an ASGI app for one request and write its response to the socket
+    """
+    delivered = False
+    response = {"chunked": False}
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            headers = list(message.get("headers", []))
+            names = {name.lower() for name, _ in headers}
+            if b"content-length" not in names:
+                response["chunked"] = True
+                headers.append((b"transfer-encoding", b"chunked"))
+            headers.append((b"connection", b"keep-alive" if keep_alive else b"close"))
+            lines = [f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}".encode("latin-1")]
+            lines += [name + b": " + value for name, value in headers]
+            writer.write(b"\r\n".join(lines) + b"\r\n\r\n")
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            more = message.get("more_body", False)
+            if response["chunked"]:
+                if chunk:
+                    writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                if not more:
+                    writer.write(b"0\r\n\r\n")
+            else:
+                writer.write(chunk)
+            # Wait for slow clients instead of buffering the whole file
+            await writer.drain()
+
+    await app(scope, receive, send)
+
+
+async def _handle_connection(app, reader, writer):
+    peer = writer.get_extra_info("peername")
+    sock = writer.get_extra_info("sockname")
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, target, version = request_line.decode("latin-1").split()
+
+            headers = []
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers.append((name.strip().lower().encode("latin-1"), value.strip().encode("latin-1")))
+            header_map = dict(headers)
+
+            length = int(header_map.get(b"content-length", b"0"))
+            if length > MAX_BODY_BYTES:
+                writer.write(b"HTTP/1.1 413 Payload Too Large\r\ncontent-length: 0\r\nconnection: close\r\n\r\n")
+                await writer.drain()
+                break
+            body = await reader.readexactly(length) if length else b""
+
+            path, _, query = target.partition("?")
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": version.partition("/")[2],
+                "method": method.upper(),
+                "scheme": "http",
+                "path": urllib.parse.unquote(path),
+                "raw_path": path.encode("latin-1"),
+                "query_string": query.encode("latin-1"),
+                "root_path": "",
+                "headers": headers,
+                "client": peer[:2] if peer else None,
+                "server": sock[:2] if sock else None,
+            }
+            keep_alive = version == "HTTP/1.1" and header_map.get(b"connection", b"").lower() != b"close"
+            await _run_app(app, scope, body, writer, keep_alive)
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(app, host="127.0.0.1", port=8080, ready=None):
+    """
+    Serve an ASGI application over HTTP/1.1 until cancelled
+
+    Args:
+        app (callable): ASGI application
+        host (str, optional): Interface to bind
+        port (int, optional): Port to listen on; 0 picks a free one
+        ready (callable, optional): Called with the bound port once listening
+    """
+    server = await asyncio.start_server(lambda r, w: _handle_connection(app, r, w), host, port)
+    if ready:
+        ready(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve invoice generation over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080)")
+    parser.add_argument("--workers", type=int, default=None, help="Render processes (default: CPU count)")
+    parser.add_argument("--max-pending", type=int, default=32, help="Jobs queued or running before 429 (default: 32)")
+    parser.add_argument("--output-dir", default=SERVICE_OUTPUT_DIR, help="Directory for generated PDFs")
+    parser.add_argument("--no-jpg", action="store_true", help="Only generate PDFs")
+    parser.add_argument("--profile", choices=sorted(PDF_PROFILES), default="standard",
+                        help="PDF output profile; compact makes the smallest files (default: standard)")
+    args = parser.parse_args(argv)
+
+    # Stop on SIGTERM like on Ctrl+C, so the render processes are shut down too
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    service = InvoiceService(args.output_dir, args.workers, args.max_pending, with_jpg=not args.no_jpg,
+                             profile=args.profile)
+    try:
+        asyncio.run(serve(service, args.host, args.port,
+                          ready=lambda port: print(f"Serving on http://{args.host}:{port}", flush=True)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Durable ledger of accepted documents with running totals
+
+Every accepted invoice or receipt is stored in a local SQLite database. A
+trigger keeps per-transaction-type totals up to date in the same write, so
+reading the totals never rescans the history.
+"""
+import os
+import sqlite3
+import threading
+
+# Path to the ledger database
+LEDGER_FILE = "data/ledger.db"
+
+# Simplified conversion rate used for totals (1 USD = 0.79 GBP)
+USD_TO_GBP_RATE = 0.79
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    document_type TEXT NOT NULL,
+    document_number TEXT NOT NULL,
+    transaction_type TEXT NOT NULL,
+    entity_name TEXT NOT NULL,
+    amount REAL NOT NULL,
+    currency TEXT NOT NULL,
+    amount_gbp REAL NOT NULL,
+    date TEXT NOT NULL,
+    recorded_at TEXT NOT NULL DEFAULT (datetime('now')),
+    UNIQUE (document_type, document_number, entity_name, date, amount)
+);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date);
+CREATE INDEX IF NOT EXISTS idx_transactions_entity ON transactions (entity_name);
+CREATE INDEX IF NOT EXISTS idx_transactions_number ON transactions (document_number);
+
+CREATE TABLE IF NOT EXISTS totals (
+    transaction_type TEXT PRIMARY KEY,
+    total_gbp REAL NOT NULL DEFAULT 0,
+    document_count INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO totals (transaction_type) VALUES ('Income'), ('Expense');
+
+CREATE TRIGGER IF NOT EXISTS transactions_update_totals
+AFTER INSERT ON transactions
+BEGIN
+    INSERT OR IGNORE INTO totals (transaction_type) VALUES (NEW.transaction_type);
+    UPDATE totals
+    SET total_gbp = total_gbp + NEW.amount_gbp,
+        document_count = document_count + 1
+    WHERE transaction_type = NEW.transaction_type;
+END;
+"""
+
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+
+def _connect():
+    """
+    Open a connection to the ledger, creating the schema on first use
+    """
+    os.makedirs(os.path.dirname(LEDGER_FILE), exist_ok=True)
+    connection = sqlite3.connect(LEDGER_FILE, timeout=30)
+    connection.row_factory = sqlite3.Row
+
+    if LEDGER_FILE not in _initialized_paths:
+        with _init_lock:
+            if LEDGER_FILE not in _initialized_paths:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(_SCHEMA)
+                _initialized_paths.add(LEDGER_FILE)
+    return connection
+
+
+def to_gbp(amount, currency):
+    """
+    Convert an amount to GBP for totals
+
+    Args:
+        amount (float): Transaction amount
+        currency (str): "GBP" or "USD"
+
+    Returns:
+        float: The amount in GBP
+    """
+    if currency == "USD":
+        return amount * USD_TO_GBP_RATE
+    return amount
+
+
+def record_transaction(document_type, document_number, transaction_type, entity_name, amount, currency, date):
+    """
+    Record an accepted document in the ledger
+
+    Recording the same document twice is ignored, so totals are not
+    double-counted when Accept is clicked again.
+
+    Args:
+        document_type (str): "Invoice" or "Receipt"
+        document_number (str): Formatted number, e.g. "INV001"
+        transaction_type (str): "Income" or "Expense"
+        entity_name (str): Name of the person or entity
+        amount (float): Amount in the document currency
+        currency (str): "GBP" or "USD"
+        date (date): Transaction date
+
+    Returns:
+        bool: True if the document was recorded, False if it was already there
+    """
+    connection = _connect()
+    try:
+        with connection:
+            cursor = connection.execute(
+                """
+                INSERT OR IGNORE INTO transactions
+                    (document_type, document_number, transaction_type, entity_name,
+                     amount, currency, amount_gbp, date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (document_type, document_number, transaction_type, entity_name,
+                 amount, currency, to_gbp(amount, currency), date.isoformat())
+            )
+        return cursor.rowcount == 1
+    finally:
+        connection.close()
+
+
+def get_totals():
+    """
+    Read the running totals
+
+    Returns:
+        dict: Total in GBP per transaction type, e.g. {"Income": 120.0, "Expense": 0.0}
+    """
+    connection = _connect()
+    try:
+        rows = connection.execute("SELECT transaction_type, total_gbp FROM totals").fetchall()
+    finally:
+        connection.close()
+    return {row["transaction_type"]: row["total_gbp"] for row in rows}
+
+
+def list_transactions(entity_name=None, start_date=None, end_date=None, limit=None):
+    """
+    List recorded transactions, newest first
+
+    Args:
+        entity_name (str, optional): Only this entity
+        start_date (date, optional): Only on or after this date
+        end_date (date, optional): Only on or before this date
+        limit (int, optional): Maximum number of rows
+
+    Returns:
+        list: One dict per transaction
+    """
+    query = "SELECT * FROM transactions WHERE 1 = 1"
+    params = []
+    if entity_name:
+        query += " AND entity_name = ?"
+        params.append(entity_name)
+    if start_date:
+        query += " AND date >= ?"
+        params.append(start_date.isoformat())
+    if end_date:
+        query += " AND date <= ?"
+        params.append(end_date.isoformat())
+    query += " ORDER BY date DESC, id DESC"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    connection = _connect()
+    try:
+        return [dict(row) for row in connection.execute(query, params)]
+    finally:
+        connection.close()
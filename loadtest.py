@@ -0,0 +1,186 @@
+"""
+Load test for the invoice HTTP service
+
+Each simulated client submits a document, polls its status until it is done
+and downloads the PDF. Requests refused with 429 are retried after the
+Retry-After delay and counted, so the report shows how much backpressure the
+service applied as well as its throughput and latency.
+
+Usage:
+    python loadtest.py --spawn --requests 200 --concurrency 16
+    python loadtest.py --url http://127.0.0.1:8080 --requests 500
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+# Seconds between status polls
+POLL_INTERVAL = 0.05
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else None
+
+
+class _Client:
+    """
+    One keep-alive connection to the service
+    """
+
+    def __init__(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        self.connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=120)
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body else {}
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        return response, response.read()
+
+
+def run_client(url, index, stats, lock):
+    """
+    Submit, poll and download one document
+
+    Returns:
+        dict: Timings in seconds, or an "error" entry
+    """
+    client = _Client(url)
+    payload = {
+        "entity_name": f"Load Test Client {index % 50}",
+        "entity_type": "Company",
+        "amount": 100 + index,
+        "description": "Load test - Web portal implementation",
+    }
+    started = time.perf_counter()
+    while True:
+        response, body = client.request("POST", "/documents", payload)
+        if response.status != 429:
+            break
+        with lock:
+            stats["rejected"] += 1
+        time.sleep(float(response.getheader("Retry-After", "1")))
+    accepted = time.perf_counter()
+    if response.status != 202:
+        return {"error": f"POST {response.status}: {body[:200]!r}"}
+    job = json.loads(body)
+
+    while True:
+        response, body = client.request("GET", job["status_url"])
+        status = json.loads(body)
+        if status["state"] in ("done", "failed"):
+            break
+        time.sleep(POLL_INTERVAL)
+    if status["state"] == "failed":
+        return {"error": status.get("error")}
+
+    response, body = client.request("GET", status["pdf_url"])
+    finished = time.perf_counter()
+    if response.status != 200 or not body.startswith(b"%PDF"):
+        return {"error": f"Download {response.status}"}
+    return {"submit": accepted - started, "total": finished - started, "bytes": len(body)}
+
+
+def run_load(url, requests, concurrency):
+    """
+    Drive requests documents through the service with concurrency clients
+
+    Returns:
+        dict: Counts, docs/sec and latency percentiles in milliseconds
+    """
+    stats = {"rejected": 0}
+    lock = threading.Lock()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda index: run_client(url, index, stats, lock), range(requests)))
+    elapsed = time.perf_counter() - started
+
+    ok = [result for result in results if "error" not in result]
+    errors = [result["error"] for result in results if "error" in result]
+    totals = [result["total"] for result in ok]
+    submits = [result["submit"] for result in ok]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "completed": len(ok),
+        "failed": len(errors),
+        "rejected_429": stats["rejected"],
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(statistics.median(totals) * 1000, 1) if totals else None,
+        "p95_ms": round(percentile(totals, 0.95) * 1000, 1) if totals else None,
+        "submit_p95_ms": round(percentile(submits, 0.95) * 1000, 1) if submits else None,
+        "errors": errors[:5],
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_service(workers=None, max_pending=32, with_jpg=True):
+    """
+    Start invoice_service.py in a subprocess and wait until it accepts connections
+
+    Returns:
+        tuple: (Popen, base URL)
+    """
+    port = _free_port()
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "invoice_service.py"),
+               "--port", str(port), "--max-pending", str(max_pending)]
+    if workers:
+        command += ["--workers", str(workers)]
+    if not with_jpg:
+        command.append("--no-jpg")
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("The service did not start within 30 seconds")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the invoice HTTP service")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="Service base URL")
+    parser.add_argument("--spawn", action="store_true", help="Start a local service for the test")
+    parser.add_argument("--requests", type=int, default=200, help="Documents to generate (default: 200)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Simultaneous clients (default: 16)")
+    parser.add_argument("--workers", type=int, default=None, help="Render processes of a spawned service")
+    parser.add_argument("--max-pending", type=int, default=32, help="Admission limit of a spawned service")
+    parser.add_argument("--no-jpg", action="store_true", help="Spawned service generates PDFs only")
+    args = parser.parse_args(argv)
+
+    process = None
+    url = args.url
+    if args.spawn:
+        process, url = spawn_service(args.workers, args.max_pending, not args.no_jpg)
+    try:
+        print(json.dumps(run_load(url, args.requests, args.concurrency), indent=2))
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+Persistent index of the invoice and receipt numbers actually issued
+
+Each document type keeps a bitmap with one bit per number, plus a count of
+every number that was issued more than once (forced reuse). The index is
+loaded into memory once and only re-read when the file on disk changes, so
+an existence check is a stat() and a bit test rather than a JSON parse.
+
+Writers must hold the invoice counter lock (see invoice_generator), which
+keeps the index and the counters consistent across processes.
+"""
+import base64
+import binascii
+import json
+import os
+import threading
+
+from utils import atomic_write
+
+# Path to the issued-number index
+INDEX_FILE = "data/issued_numbers.json"
+
+# Document types numbered through the index; the counter file also holds
+# the statement counter, which has its own number format
+DOCUMENT_TYPES = ("Invoice", "Receipt")
+
+
+class _Issued:
+    """
+    Issued numbers for one document type
+
+    Bit 0 is always set so number 0 is never reported as free.
+    """
+
+    def __init__(self, bitmap=None, duplicates=None):
+        self.bitmap = bitmap or bytearray(b"\x01")
+        self.bitmap[0] |= 1
+        self.duplicates = duplicates or {}
+
+    def __contains__(self, number):
+        byte = number >> 3
+        return 0 < number and byte < len(self.bitmap) and bool(self.bitmap[byte] & (1 << (number & 7)))
+
+    def add(self, number):
+        """
+        Set the bit for number
+
+        Returns:
+            bool: False if the number was already issued
+        """
+        if number in self:
+            self.duplicates[number] = self.duplicates.get(number, 0) + 1
+            return False
+        byte = number >> 3
+        if byte >= len(self.bitmap):
+            self.bitmap.extend(bytes(max(byte + 1 - len(self.bitmap), len(self.bitmap))))
+        self.bitmap[byte] |= 1 << (number & 7)
+        return True
+
+    def highest(self):
+        stripped = self.bitmap.rstrip(b"\x00")
+        return (len(stripped) - 1) * 8 + stripped[-1].bit_length() - 1
+
+    def next_free(self, start=1):
+        # Skip whole bytes of issued numbers at C speed, then test bit by bit
+        byte = start >> 3
+        full = len(self.bitmap[byte:]) - len(self.bitmap[byte:].lstrip(b"\xff"))
+        number = max(start, (byte + full) * 8)
+        while number in self:
+            number += 1
+        return number
+
+    def gaps(self):
+        return [number for number in range(1, self.highest()) if number not in self]
+
+    def count(self):
+        return sum(bin(b).count("1") for b in self.bitmap) - 1
+
+    def to_json(self):
+        return {
+            "bitmap": base64.b64encode(bytes(self.bitmap.rstrip(b"\x00"))).decode("ascii"),
+            "duplicates": {str(number): count for number, count in sorted(self.duplicates.items())},
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        try:
+            bitmap = bytearray(base64.b64decode(data.get("bitmap", ""), validate=True))
+        except (binascii.Error, ValueError):
+            # A damaged bitmap loses the record of gaps and forced numbers; the
+            # counters still keep new reservations above every number issued
+            bitmap = None
+        return cls(bitmap, {int(number): count for number, count in data.get("duplicates", {}).items()})
+
+
+class IssuedNumberIndex:
+    """
+    In-memory view of INDEX_FILE, reloaded only when the file changes
+    """
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._types = {}
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._signature, self._types = None, {}
+            return
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                data = {}
+        self._types = {
+            document_type: _Issued.from_json(entry)
+            for document_type, entry in data.items() if document_type in DOCUMENT_TYPES
+        }
+        self._signature = signature
+
+    def _save(self):
+        data = {document_type: issued.to_json() for document_type, issued in self._types.items()}
+        atomic_write(self.path, json.dumps(data, sort_keys=True).encode("utf-8"))
+        stat = os.stat(self.path)
+        self._signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _issued(self, document_type):
+        issued = self._types.get(document_type)
+        if issued is None:
+            issued = self._types[document_type] = _Issued()
+        return issued
+
+    def exists(self):
+        """
+        Whether the index file has been created yet
+        """
+        return os.path.exists(self.path)
+
+    def contains(self, number, document_type):
+        """
+        Check whether a number has been issued
+
+        Args:
+            number (int): The numeric part of the document number
+            document_type (str): "Invoice" or "Receipt"
+
+        Returns:
+            bool: True if the number was issued at least once
+        """
+        with self._lock:
+            self._refresh()
+            issued = self._types.get(document_type)
+            return issued is not None and number in issued
+
+    def next_free(self, document_type, start=1):
+        """
+        Find the lowest number at or after start that has not been issued
+
+        Returns:
+            int: The first free number
+        """
+        with self._lock:
+            self._refresh()
+            return self._issued(document_type).next_free(start)
+
+    def mark(self, numbers, document_type):
+        """
+        Record numbers as issued. The caller must hold the counter lock.
+
+        Numbers that were already issued are counted as duplicates.
+
+        Args:
+            numbers (iterable): Numeric parts of the issued document numbers
+            document_type (str): "Invoice" or "Receipt"
+
+        Returns:
+            list: The numbers that had already been issued before
+        """
+        with self._lock:
+            self._refresh()
+            issued = self._issued(document_type)
+            duplicates = [number for number in numbers if not issued.add(number)]
+            self._save()
+        return duplicates
+
+    def seed(self, counters):
+        """
+        Build the index from the counters, treating 1..counter as issued
+
+        Only DOCUMENT_TYPES are seeded. Does nothing if the index already
+        exists. The caller must hold the counter lock.
+
+        Args:
+            counters (dict): Current counter per document type
+        """
+        with self._lock:
+            self._refresh()
+            if self._signature is not None:
+                return
+            self._types = {}
+            for document_type in DOCUMENT_TYPES:
+                issued = self._issued(document_type)
+                for number in range(1, counters.get(document_type, 0) + 1):
+                    issued.add(number)
+            self._save()
+
+    def clear(self, counters):
+        """
+        Forget every issued number and duplicate, then seed from counters
+        """
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._signature, self._types = None, {}
+        self.seed(counters)
+
+    def audit(self, counters=None):
+        """
+        Report gaps and duplicates per document type
+
+        Args:
+            counters (dict, optional): Current counters, to flag numbers
+                issued above the counter
+
+        Returns:
+            dict: document type -> issued count, highest number, gaps,
+            duplicates ({number: extra issues}) and numbers above the counter
+        """
+        with self._lock:
+            self._refresh()
+            report = {}
+            for document_type, issued in sorted(self._types.items()):
+                highest = issued.highest()
+                counter = (counters or {}).get(document_type)
+                report[document_type] = {
+                    "issued": issued.count(),
+                    "highest": highest,
+                    "gaps": issued.gaps(),
+                    "duplicates": dict(sorted(issued.duplicates.items())),
+                    "above_counter": [n for n in range(counter + 1, highest + 1) if n in issued]
+                    if counter is not None else [],
+                }
+        return report
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_number_index():
+    """
+    Return the process-wide issued-number index
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = IssuedNumberIndex()
+    return _index
@@ -1,67 +1,116 @@
-import os
-import random
+"""
+Project descriptions for invoices and receipts
 
-def generate_smart_description():
+Descriptions come from the provider chosen with DESCRIPTION_PROVIDER (see
+description_providers); the default is the built-in random lists. Answers
+from a model provider are cached on disk by entity and context. Interactive
+callers wait at most a latency budget for the provider and otherwise get a
+description from the built-in lists straight away; the late answer still
+lands in the cache, so the next document for that client gets it.
+"""
+import asyncio
+import threading
+
+from description_cache import cache_key, get_description_cache
+from description_providers import get_provider, random_description
+
+# Seconds an interactive caller waits for the provider before falling back
+LATENCY_BUDGET_SECONDS = 1.5
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _event_loop():
+    """
+    Event loop running provider requests in a background thread
+
+    Requests that miss the latency budget keep running on it until they finish.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="descriptions", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+async def _describe_and_store(provider, keys, items):
+    descriptions = await provider.describe_many(items)
+    get_description_cache().put_many({key: d for key, d in zip(keys, descriptions) if d})
+    return descriptions
+
+
+def description_context(document_type, transaction_type, entity_type):
+    """
+    Context string passed to the provider and included in the cache key
+
+    Returns:
+        str: e.g. "Invoice, Income, Company"
+    """
+    return f"{document_type}, {transaction_type}, {entity_type}"
+
+
+def generate_descriptions(requests, budget=None, refresh=False, provider=None):
+    """
+    Describe many documents with batched provider requests
+
+    Cached answers are reused, each distinct (entity, context) pair is asked
+    for once, and anything the provider does not answer in time or fails on
+    gets a description from the built-in lists.
+
+    Args:
+        requests (list): (entity_name, context) pairs
+        budget (float, optional): Seconds to wait for the provider; None waits
+            until every request has finished
+        refresh (bool, optional): Ask the provider even if a cached answer exists
+        provider (DescriptionProvider, optional): Defaults to get_provider()
+
+    Returns:
+        list: One description per request, in order
+    """
+    provider = provider or get_provider()
+    if not provider.cacheable:
+        return [random_description() for _ in requests]
+
+    keys = [cache_key(provider.name, entity_name, context) for entity_name, context in requests]
+    found = {} if refresh else get_description_cache().get_many(list(set(keys)))
+
+    missing = {}
+    for key, (entity_name, context) in zip(keys, requests):
+        if key not in found and key not in missing:
+            missing[key] = {"entity": entity_name or "", "context": context or ""}
+
+    if missing:
+        future = asyncio.run_coroutine_threadsafe(
+            _describe_and_store(provider, list(missing), list(missing.values())),
+            _event_loop()
+        )
+        try:
+            found.update({key: d for key, d in zip(missing, future.result(timeout=budget)) if d})
+        except TimeoutError:
+            # Left running so the answers reach the cache
+            pass
+        except Exception as e:
+            print(f"Description provider failed: {e}")
+
+    return [found.get(key) or random_description() for key in keys]
+
+
+def generate_smart_description(entity_name=None, context=None, budget=LATENCY_BUDGET_SECONDS, refresh=False):
     """
     Generate a smart description about software development services
     Describes a specific software project requested by client
-    
+
+    Args:
+        entity_name (str, optional): Client the document is for
+        context (str, optional): See description_context()
+        budget (float, optional): Seconds to wait for the provider
+        refresh (bool, optional): Skip the cache, e.g. to regenerate a document
+
     Returns:
         str: A suitable description for the invoice/receipt with a product name
     """
-    # Software project descriptions
-    software_descriptions = [
-        "Development of custom inventory management system",
-        "Mobile application development for customer engagement",
-        "Web portal implementation for client management",
-        "E-commerce platform development with payment integration",
-        "Business intelligence dashboard implementation",
-        "Custom CRM system development and integration",
-        "API development for third-party service integration",
-        "Software maintenance and performance optimization",
-        "Legacy system modernization and migration",
-        "Cloud migration and infrastructure setup",
-        "Enterprise resource planning system implementation",
-        "Customer service ticketing system development",
-        "Accounting software customization",
-        "HR management system development",
-        "E-learning platform development and integration",
-        "Real-time messaging application development",
-        "Project management software implementation",
-        "Data visualization dashboard development",
-        "Automated reporting system implementation",
-        "Membership management portal development",
-        "Online booking system implementation",
-        "Fleet management software development",
-        "Restaurant management system implementation",
-        "Inventory tracking software development",
-        "Point of sale system implementation"
-    ]
-    
-    # Product/System names
-    product_names = [
-        "ProAccess",
-        "SmartFlow",
-        "DataVista",
-        "NexusCore",
-        "OmniTrack",
-        "InteliServe",
-        "PrimeSoft",
-        "MetaLogic",
-        "OptiSphere",
-        "VisiTech",
-        "SyncWave",
-        "PrecisionPro",
-        "TotalSphere",
-        "EnterLogic",
-        "MaxiTech",
-        "PowerPortal",
-        "SmartPulse",
-        "EliteServe",
-        "SyncMatrix",
-        "TechEdge"
-    ]
-
-    # Generate a description with a product name
-    description = random.choice(software_descriptions) + " - " + random.choice(product_names) + " System"
-    return description
+    return generate_descriptions([(entity_name, context)], budget=budget, refresh=refresh)[0]
@@ -1,118 +1,450 @@
+import collections
+import contextlib
+import functools
 import io
 import os
+import threading
 from datetime import datetime
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch, cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
+from reportlab.pdfbase import pdfdoc, pdfmetrics
 from reportlab.pdfgen import canvas
+from PIL import Image as PILImage
+import tracing
+from utils import atomic_write, join_inside
+
+# Bump whenever the layout changes so cached renders are not reused
+TEMPLATE_VERSION = "1"
+
+
+class InvoiceTemplate:
+    """
+    Paragraph and table styles shared by every generated document
+
+    Styles are only read while building, so one instance can be shared by
+    all calls, including calls running on different threads.
+    """
+
+    def __init__(self):
+        # Styles - reducing font sizes for compact layout
+        self.styles = getSampleStyleSheet()
+        self.styles.add(ParagraphStyle(
+            name='DocumentTitle',
+            fontName='Helvetica-Bold',
+            fontSize=14,  # Reduced from 18
+            alignment=1,
+            spaceAfter=6  # Reduced from 12
+        ))
+        self.styles.add(ParagraphStyle(
+            name='SectionHeading',
+            fontName='Helvetica-Bold',
+            fontSize=10,  # Reduced from 14
+            alignment=0,
+            spaceAfter=4  # Reduced from 6
+        ))
+        self.styles.add(ParagraphStyle(
+            name='BasicText',
+            fontName='Helvetica',
+            fontSize=8,   # Reduced from 10
+            alignment=0,
+            spaceAfter=3  # Reduced from 6
+        ))
+        self.styles.add(ParagraphStyle(
+            name='BoldText',
+            fontName='Helvetica-Bold',
+            fontSize=8,   # Reduced from 10
+            alignment=0,
+            spaceAfter=3  # Reduced from 6
+        ))
+        self.styles.add(ParagraphStyle(
+            name='RightAligned',
+            fontName='Helvetica',
+            fontSize=8,   # Reduced from 10
+            alignment=2,
+            spaceAfter=3  # Reduced from 6
+        ))
+        self.styles.add(ParagraphStyle(
+            name='CenterAligned',
+            fontName='Helvetica',
+            fontSize=8,   # Reduced from 10
+            alignment=1,
+            spaceAfter=3  # Reduced from 6
+        ))
+
+        # Header row: title on the left, logo aligned right
+        self.header_table_style = TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+            ('TOPPADDING', (0, 0), (-1, -1), 2),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+        ])
+
+        # Borderless label/value blocks (company and customer information)
+        self.info_table_style = TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('TOPPADDING', (0, 0), (-1, -1), 2),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+        ])
+
+        # Gridded label/value blocks (payment and bank details)
+        self.grid_table_style = TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('TOPPADDING', (0, 0), (-1, -1), 2),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ])
+
+        self.transaction_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+            ('TOPPADDING', (0, 0), (-1, 0), 6),
+            ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ])
+
+        self.total_table_style = TableStyle([
+            ('BACKGROUND', (1, 0), (1, 0), colors.lightgrey),
+            ('TEXTCOLOR', (1, 0), (1, 0), colors.black),
+            ('ALIGN', (1, 0), (2, 0), 'RIGHT'),
+            ('FONTNAME', (1, 0), (2, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (1, 0), (2, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ])
+
+        # Statement summary: grey header row, amounts right-aligned in the last column
+        self.summary_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('TOPPADDING', (0, 0), (-1, -1), 3),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ])
+
+
+_invoice_template = None
+_invoice_template_lock = threading.Lock()
+
+
+def get_invoice_template():
+    """
+    Get the process-wide InvoiceTemplate, building it on first use
+
+    Returns:
+        InvoiceTemplate: The shared styles
+    """
+    global _invoice_template
+    if _invoice_template is None:
+        with _invoice_template_lock:
+            if _invoice_template is None:
+                _invoice_template = InvoiceTemplate()
+    return _invoice_template
+
+
+# Company logo shown in the document header
+LOGO_PATH = "assets/company_logo.png"
+
+# Printed width of the logo
+LOGO_WIDTH = 1 * inch
+
+# Resolution the logo is downsampled to for its printed width (None keeps the original)
+LOGO_DPI = 300
+
+# Output profiles for generated PDFs:
+#   compress: Flate-compress page streams
+#   ascii85: wrap compressed page streams in ASCII85 text, ReportLab's
+#       default; about a quarter larger than the binary stream. Images
+#       always use ReportLab's default filters.
+#   image_dpi: resolution images are downsampled to at their printed size
+#   strip_metadata: leave the title, author, producer and dates out
+#   standard_fonts_only: refuse any font a viewer does not already have,
+#       so no font program is ever embedded
+PDF_PROFILES = {
+    "standard": {
+        "compress": True, "ascii85": True, "image_dpi": LOGO_DPI,
+        "strip_metadata": False, "standard_fonts_only": False,
+    },
+    "compact": {
+        "compress": True, "ascii85": False, "image_dpi": 150,
+        "strip_metadata": True, "standard_fonts_only": True,
+    },
+}
+
+
+class LogoAsset:
+    """
+    A logo decoded and measured once, ready to embed in any number of PDFs
+
+    Attributes:
+        data (bytes): Image file contents to embed
+        pixel_width (int): Width of the embedded image in pixels
+        pixel_height (int): Height of the embedded image in pixels
+        signature (tuple): (path, mtime, size) of the source file
+    """
+
+    def __init__(self, data, pixel_width, pixel_height, signature):
+        self.data = data
+        self.pixel_width = pixel_width
+        self.pixel_height = pixel_height
+        self.signature = signature
+
+    @property
+    def draw_height(self):
+        return self.pixel_height * LOGO_WIDTH / self.pixel_width
+
+
+_logo_cache = {}
+_logo_cache_lock = threading.Lock()
+
+
+def _read_logo(path, signature, dpi):
+    with open(path, "rb") as f:
+        data = f.read()
+    with PILImage.open(io.BytesIO(data)) as image:
+        width, height = image.size
+        target_width = int(round(LOGO_WIDTH / inch * dpi)) if dpi else None
+        if target_width and width > target_width:
+            # Downsample to the printed size so every PDF carries a smaller image stream
+            target_height = max(1, int(round(height * target_width / width)))
+            resized = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+            resized = resized.resize((target_width, target_height), PILImage.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, "PNG", optimize=True)
+            data, width, height = buffer.getvalue(), target_width, target_height
+    return LogoAsset(data, width, height, signature)
+
+
+def load_logo(path=LOGO_PATH, dpi=LOGO_DPI):
+    """
+    Load the company logo, reading and measuring it once per process
+
+    The cached copy is reloaded when the file's mtime or size changes.
+
+    Args:
+        path (str, optional): Logo file. Defaults to LOGO_PATH.
+        dpi (int, optional): Downsample to this resolution at the printed
+            width. None embeds the original image.
+
+    Returns:
+        LogoAsset or None: The logo, or None if the file does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    signature = (path, stat.st_mtime_ns, stat.st_size)
+
+    cached = _logo_cache.get((path, dpi))
+    if cached is not None and cached.signature == signature:
+        return cached
+
+    with _logo_cache_lock:
+        cached = _logo_cache.get((path, dpi))
+        if cached is None or cached.signature != signature:
+            cached = _read_logo(path, signature, dpi)
+            _logo_cache[(path, dpi)] = cached
+    return cached
+
+
+def logo_signature(path=LOGO_PATH):
+    """
+    Identify the current logo file for cache keys
+
+    Returns:
+        list or None: [mtime_ns, size] of the logo, or None if there is no logo
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def logo_flowable(path=LOGO_PATH, profile="standard"):
+    """
+    Build a header Image flowable from the cached logo
+
+    The logo is read and downsampled once (see load_logo); each flowable
+    wraps the cached bytes, and ReportLab embeds them once per PDF.
+
+    Args:
+        profile (str, optional): Key of PDF_PROFILES
+
+    Returns:
+        Image or None: The logo scaled to LOGO_WIDTH, or None if there is no logo
+    """
+    settings = PDF_PROFILES[profile]
+    asset = load_logo(path, settings["image_dpi"])
+    if asset is None:
+        return None
+    return Image(io.BytesIO(asset.data), width=LOGO_WIDTH, height=asset.draw_height)
+
+
+def pdf_filename(document_type, invoice_number, date):
+    """
+    Build the conventional filename for a generated document
+
+    Returns:
+        str: e.g. "invoice_INV001_20250519.pdf"
+    """
+    return f"{document_type.lower()}_{invoice_number}_{date.strftime('%Y%m%d')}.pdf"
+
 
 def generate_pdf(
     document_type, transaction_type, entity_name, entity_type, 
     amount, date, payment_method, description, notes, invoice_number,
     company_name, company_address, company_email, company_phone,
-    company_website, company_number, company_vat, currency="GBP"
+    company_website, company_number, company_vat, currency="GBP",
+    output_dir=None, profile="standard"
 ):
     """
-    Generate a PDF invoice or receipt
-    
+    Generate a PDF invoice or receipt and write it to disk
+
+    Args:
+        output_dir (str, optional): Directory to write into. Defaults to the
+            current working directory.
+        profile (str, optional): Output profile, a key of PDF_PROFILES;
+            "compact" makes the smallest files for mailing and archiving
+
     Returns:
-        str: The filename of the generated PDF
+        str: The path of the generated PDF (just the filename when output_dir is None)
     """
-    # Create a filename based on document type and invoice number
-    filename = f"{document_type.lower()}_{invoice_number}_{date.strftime('%Y%m%d')}.pdf"
-    
-    # Create a buffer for the PDF
-    buffer = io.BytesIO()
-    
-    # Create the PDF document with reduced margins for compact layout
-    doc = SimpleDocTemplate(
+    pdf_data = render_pdf(
+        document_type, transaction_type, entity_name, entity_type,
+        amount, date, payment_method, description, notes, invoice_number,
+        company_name, company_address, company_email, company_phone,
+        company_website, company_number, company_vat, currency, profile=profile
+    )
+
+    filename = join_inside(output_dir or "", pdf_filename(document_type, invoice_number, date))
+    atomic_write(filename, pdf_data)
+
+    return filename
+
+
+# Page margins shared by every layout (reduced from 72 for a compact layout)
+PAGE_MARGIN = 36
+
+# Bank details printed on income documents
+BANK_DETAILS = [
+    ["Name:", "Upload For Software Ltd"],
+    ["Account number:", "15336022"],
+    ["Sort code:", "23-08-01 (Use when sending money from the UK)"],
+    ["IBAN:", "GB83 TRWI 2308 0115 3360 22"],
+    ["Swift/BIC:", "TRWIGB2LXXX (Use when sending money from outside the UK)"],
+    ["Bank name:", "Wise Payments Limited"],
+    ["Bank address:", "1st Floor, Worship Square, 65 Clifton Street, London, EC2A 4JE, United Kingdom"]
+]
+
+
+def currency_symbol(currency):
+    """
+    Symbol printed in front of amounts for a currency code
+    """
+    return "$" if currency == "USD" else "£"
+
+
+def new_document(buffer):
+    """
+    Create the A4 document template every layout is built on
+    """
+    return SimpleDocTemplate(
         buffer,
         pagesize=A4,
-        rightMargin=36,  # Reduced from 72
-        leftMargin=36,   # Reduced from 72
-        topMargin=36,    # Reduced from 72
-        bottomMargin=36  # Reduced from 72
+        rightMargin=PAGE_MARGIN,
+        leftMargin=PAGE_MARGIN,
+        topMargin=PAGE_MARGIN,
+        bottomMargin=PAGE_MARGIN
     )
-    
-    # Container for the 'Flowable' objects
-    elements = []
-    
-    # Styles - reducing font sizes for compact layout
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(
-        name='DocumentTitle',
-        fontName='Helvetica-Bold',
-        fontSize=14,  # Reduced from 18
-        alignment=1,
-        spaceAfter=6  # Reduced from 12
-    ))
-    styles.add(ParagraphStyle(
-        name='SectionHeading',
-        fontName='Helvetica-Bold',
-        fontSize=10,  # Reduced from 14
-        alignment=0,
-        spaceAfter=4  # Reduced from 6
-    ))
-    styles.add(ParagraphStyle(
-        name='BasicText',
-        fontName='Helvetica',
-        fontSize=8,   # Reduced from 10
-        alignment=0,
-        spaceAfter=3  # Reduced from 6
-    ))
-    styles.add(ParagraphStyle(
-        name='BoldText',
-        fontName='Helvetica-Bold',
-        fontSize=8,   # Reduced from 10
-        alignment=0,
-        spaceAfter=3  # Reduced from 6
-    ))
-    styles.add(ParagraphStyle(
-        name='RightAligned',
-        fontName='Helvetica',
-        fontSize=8,   # Reduced from 10
-        alignment=2,
-        spaceAfter=3  # Reduced from 6
-    ))
-    styles.add(ParagraphStyle(
-        name='CenterAligned',
-        fontName='Helvetica',
-        fontSize=8,   # Reduced from 10
-        alignment=1,
-        spaceAfter=3  # Reduced from 6
-    ))
+
+
+class _EmptyInfo(pdfdoc.PDFInfo):
+    """
+    Document information dictionary with no entries
+    """
+
+    def format(self, document):
+        return pdfdoc.PDFDictionary({}).format(document)
+
+
+class ProfileCanvas(canvas.Canvas):
+    """
+    Canvas that writes its PDF according to one of PDF_PROFILES
+
+    Args:
+        profile (str, optional): Key of PDF_PROFILES
+    """
+
+    def __init__(self, *args, profile="standard", **kwargs):
+        self.profile = profile
+        self._settings = PDF_PROFILES[profile]
+        kwargs["pageCompression"] = int(self._settings["compress"])
+        super().__init__(*args, **kwargs)
+        if self._settings["strip_metadata"]:
+            self._doc.info = _EmptyInfo()
+
+    def save(self):
+        if self._settings["standard_fonts_only"]:
+            embedded = sorted(set(self._doc.fontMapping) - set(pdfmetrics.standardFonts))
+            if embedded:
+                raise ValueError(f"PDF profile {self.profile!r} only allows the standard fonts, not {embedded}")
+        if self._settings["compress"] and not self._settings["ascii85"]:
+            # A page builds its stream with rl_config's filters unless it already has one
+            for page in self._doc.Pages.pages:
+                if page.Contents is None:
+                    page.Contents = pdfdoc.PDFStream(content=page.stream, filters=[pdfdoc.PDFZCompress])
+                    page.Contents.__Comment__ = "page stream"
+        super().save()
+
+
+def profile_canvas(profile):
+    """
+    Canvas maker for SimpleDocTemplate.build that applies a PDF profile
+    """
+    return functools.partial(ProfileCanvas, profile=profile)
+
+
+def header_section(document_type, width, profile="standard"):
+    """
+    Document title with the company logo on the right
+    """
+    styles = get_invoice_template().styles
     
     # Create a table for the header with logo on the right
-    logo_path = "assets/company_logo.png"
-    header_data = []
-    if os.path.exists(logo_path):
-        try:
-            logo = Image(logo_path)
-            # Resize logo to small size (max width 1 inch)
-            logo_width = 1 * inch
-            logo_height = (logo.imageHeight * logo_width) / logo.imageWidth
-            logo.drawWidth = logo_width
-            logo.drawHeight = logo_height
-            
-            # Create a header table with logo on the right
-            header_data = [[Paragraph(f"<b>{document_type.upper()}</b>", styles['DocumentTitle']), logo]]
-        except Exception as e:
-            # If logo fails, just add the document title
-            header_data = [[Paragraph(f"<b>{document_type.upper()}</b>", styles['DocumentTitle']), ""]]
-    else:
-        header_data = [[Paragraph(f"<b>{document_type.upper()}</b>", styles['DocumentTitle']), ""]]
-    
-    header_table = Table(header_data, colWidths=[4*doc.width/5.0, 1*doc.width/5.0])
-    header_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ('TOPPADDING', (0, 0), (-1, -1), 2),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-    ]))
-    elements.append(header_table)
-    elements.append(Spacer(1, 0.1*inch))
+    title = Paragraph(f"<b>{document_type.upper()}</b>", styles['DocumentTitle'])
+    try:
+        logo = logo_flowable(profile=profile)
+    except Exception as e:
+        # If logo fails, just add the document title
+        logo = None
+    header_data = [[title, logo or ""]]
+    
+    header_table = Table(header_data, colWidths=[4*width/5.0, 1*width/5.0])
+    header_table.setStyle(get_invoice_template().header_table_style)
+    return [header_table, Spacer(1, 0.1*inch)]
+
+
+def company_section(
+    invoice_number, date, company_name, company_address, company_email,
+    company_phone, company_website, company_number, company_vat, width
+):
+    """
+    Company details with the document number and date on the right
+    """
+    template = get_invoice_template()
+    styles = template.styles
     
     # Company and Customer Information
     data = [
@@ -139,14 +471,17 @@ def generate_pdf(
     if company_vat:
         data.append([Paragraph(f"VAT: {company_vat}", styles['BasicText']), ""])
     
-    company_table = Table(data, colWidths=[doc.width/2.0]*2)
-    company_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('TOPPADDING', (0, 0), (-1, -1), 2),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-    ]))
-    elements.append(company_table)
-    elements.append(Spacer(1, 0.2*inch))
+    company_table = Table(data, colWidths=[width/2.0]*2)
+    company_table.setStyle(template.info_table_style)
+    return [company_table, Spacer(1, 0.2*inch)]
+
+
+def entity_section(transaction_type, entity_name, entity_type, width):
+    """
+    Customer (income) or vendor (expense) information
+    """
+    template = get_invoice_template()
+    styles = template.styles
     
     # Customer/Vendor Information Section
     if transaction_type == "Income":
@@ -156,9 +491,6 @@ def generate_pdf(
         customer_title = "VENDOR INFORMATION"
         entity_label = "Vendor Name:"
     
-    elements.append(Paragraph(customer_title, styles['SectionHeading']))
-    elements.append(Spacer(1, 0.1*inch))
-    
     customer_data = [
         [Paragraph(f"<b>{entity_label}</b>", styles['BasicText']), 
          Paragraph(entity_name, styles['BasicText'])],
@@ -166,18 +498,21 @@ def generate_pdf(
          Paragraph(entity_type, styles['BasicText'])],
     ]
     
-    customer_table = Table(customer_data, colWidths=[doc.width/4.0, 3*doc.width/4.0])
-    customer_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('TOPPADDING', (0, 0), (-1, -1), 2),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-    ]))
-    elements.append(customer_table)
-    elements.append(Spacer(1, 0.1*inch))
-    
-    # Transaction Details Section
-    elements.append(Paragraph("TRANSACTION DETAILS", styles['SectionHeading']))
-    elements.append(Spacer(1, 0.1*inch))
+    customer_table = Table(customer_data, colWidths=[width/4.0, 3*width/4.0])
+    customer_table.setStyle(template.info_table_style)
+    return [
+        Paragraph(customer_title, styles['SectionHeading']),
+        Spacer(1, 0.1*inch),
+        customer_table,
+        Spacer(1, 0.1*inch),
+    ]
+
+
+def transaction_section(description, amount, notes, width):
+    """
+    Description and amount table, with notes if there are any
+    """
+    template = get_invoice_template()
     
     # Header row for the transaction table
     transaction_data = [
@@ -189,25 +524,21 @@ def generate_pdf(
     if notes:
         transaction_data.append(["Notes:", notes])
     
-    transaction_table = Table(transaction_data, colWidths=[3*doc.width/4.0, doc.width/4.0])
-    transaction_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-        ('TOPPADDING', (0, 0), (-1, 0), 6),
-        ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    elements.append(transaction_table)
-    elements.append(Spacer(1, 0.1*inch))
-    
-    # Payment Information
-    elements.append(Paragraph("PAYMENT INFORMATION", styles['SectionHeading']))
-    elements.append(Spacer(1, 0.1*inch))
+    transaction_table = Table(transaction_data, colWidths=[3*width/4.0, width/4.0])
+    transaction_table.setStyle(template.transaction_table_style)
+    return [
+        Paragraph("TRANSACTION DETAILS", template.styles['SectionHeading']),
+        Spacer(1, 0.1*inch),
+        transaction_table,
+        Spacer(1, 0.1*inch),
+    ]
+
+
+def payment_section(payment_method, transaction_type, date, width):
+    """
+    Payment method, transaction type and payment date
+    """
+    template = get_invoice_template()
     
     payment_data = [
         ["Payment Method:", payment_method],
@@ -215,36 +546,35 @@ def generate_pdf(
         ["Payment Date:", date.strftime('%d/%m/%Y')],
     ]
     
-    payment_table = Table(payment_data, colWidths=[doc.width/4.0, 3*doc.width/4.0])
-    payment_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('TOPPADDING', (0, 0), (-1, -1), 2),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    elements.append(payment_table)
-    elements.append(Spacer(1, 0.1*inch))
-    
-    # Determine currency symbol based on currency parameter
-    currency_symbol = "$" if currency == "USD" else "£"
-    
-    # Total Section
+    payment_table = Table(payment_data, colWidths=[width/4.0, 3*width/4.0])
+    payment_table.setStyle(template.grid_table_style)
+    return [
+        Paragraph("PAYMENT INFORMATION", template.styles['SectionHeading']),
+        Spacer(1, 0.1*inch),
+        payment_table,
+        Spacer(1, 0.1*inch),
+    ]
+
+
+def total_section(amount, currency, width, label="Total"):
+    """
+    Right-aligned total row
+    """
     total_data = [
-        ["", "Total", f"{currency_symbol}{amount:.2f}"],
+        ["", label, f"{currency_symbol(currency)}{amount:.2f}"],
     ]
     
-    total_table = Table(total_data, colWidths=[2*doc.width/4.0, doc.width/4.0, doc.width/4.0])
-    total_table.setStyle(TableStyle([
-        ('BACKGROUND', (1, 0), (1, 0), colors.lightgrey),
-        ('TEXTCOLOR', (1, 0), (1, 0), colors.black),
-        ('ALIGN', (1, 0), (2, 0), 'RIGHT'),
-        ('FONTNAME', (1, 0), (2, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (1, 0), (2, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    elements.append(total_table)
+    total_table = Table(total_data, colWidths=[2*width/4.0, width/4.0, width/4.0])
+    total_table.setStyle(get_invoice_template().total_table_style)
+    return [total_table]
+
+
+def footer_section(transaction_type, width):
+    """
+    VAT notice, thank-you message and, for income, the bank payment details
+    """
+    styles = get_invoice_template().styles
+    elements = []
     
     # Add simple VAT notice to fix stability issue
     elements.append(Spacer(1, 0.05*inch))
@@ -260,51 +590,329 @@ def generate_pdf(
         # Add bank details for GBP payments
         elements.append(Paragraph(thank_you_msg, styles['CenterAligned']))
         elements.append(Spacer(1, 0.1*inch))
-        
-        elements.append(Paragraph("BANK PAYMENT DETAILS", styles['SectionHeading']))
-        elements.append(Spacer(1, 0.05*inch))
-        
-        # Instructions before table
-        instructions = "Here are the GBP account details for Upload For Software Ltd on Wise.\n"
-        instructions += "If you're sending money from a bank in the UK, use these details for a domestic transfer. "
-        instructions += "For international payments, use the Swift/BIC details."
-        
-        elements.append(Paragraph(instructions, styles['BasicText']))
-        elements.append(Spacer(1, 0.1*inch))
-        
-        # Bank details in a properly sized table to avoid page break issues
-        bank_data = [
-            ["Name:", "Upload For Software Ltd"],
-            ["Account number:", "15336022"],
-            ["Sort code:", "23-08-01 (Use when sending money from the UK)"],
-            ["IBAN:", "GB83 TRWI 2308 0115 3360 22"],
-            ["Swift/BIC:", "TRWIGB2LXXX (Use when sending money from outside the UK)"],
-            ["Bank name:", "Wise Payments Limited"],
-            ["Bank address:", "1st Floor, Worship Square, 65 Clifton Street, London, EC2A 4JE, United Kingdom"]
-        ]
-        
-        # Make sure the table fits within page width
-        bank_table = Table(bank_data, colWidths=[doc.width*0.25, doc.width*0.75], splitByRow=True)
-        bank_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('TOPPADDING', (0, 0), (-1, -1), 2),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ]))
-        elements.append(bank_table)
+        elements.extend(bank_details_section(width))
     else:
         thank_you_msg = "Thank you for your services!"
         elements.append(Paragraph(thank_you_msg, styles['CenterAligned']))
     
-    # Build the PDF
-    doc.build(elements)
+    return elements
+
+
+def bank_details_section(width):
+    """
+    Wise GBP account details for incoming payments
+    """
+    template = get_invoice_template()
+    styles = template.styles
+    
+    # Instructions before table
+    instructions = "Here are the GBP account details for Upload For Software Ltd on Wise.\n"
+    instructions += "If you're sending money from a bank in the UK, use these details for a domestic transfer. "
+    instructions += "For international payments, use the Swift/BIC details."
+    
+    # Make sure the table fits within page width
+    bank_table = Table(BANK_DETAILS, colWidths=[width*0.25, width*0.75], splitByRow=True)
+    bank_table.setStyle(template.grid_table_style)
+    return [
+        Paragraph("BANK PAYMENT DETAILS", styles['SectionHeading']),
+        Spacer(1, 0.05*inch),
+        Paragraph(instructions, styles['BasicText']),
+        Spacer(1, 0.1*inch),
+        bank_table,
+    ]
+
+
+def document_sections(
+    document_type, transaction_type, entity_name, entity_type, 
+    amount, date, payment_method, description, notes, invoice_number,
+    company_name, company_address, company_email, company_phone,
+    company_website, company_number, company_vat, currency, width, cached=None,
+    profile="standard"
+):
+    """
+    Build every section of a single document
+
+    Args:
+        cached (dict, optional): Section name -> flowables already built for
+            this document; those sections are reused instead of rebuilt
+        profile (str, optional): Key of PDF_PROFILES
+
+    Returns:
+        list: (section name, flowables) pairs in page order
+    """
+    cached = cached or {}
+    builders = [
+        ("header", lambda: header_section(document_type, width, profile)),
+        ("company", lambda: company_section(
+            invoice_number, date, company_name, company_address, company_email,
+            company_phone, company_website, company_number, company_vat, width
+        )),
+        ("entity", lambda: entity_section(transaction_type, entity_name, entity_type, width)),
+        ("transaction", lambda: transaction_section(description, amount, notes, width)),
+        ("payment", lambda: payment_section(payment_method, transaction_type, date, width)),
+        ("total", lambda: total_section(amount, currency, width)),
+        ("footer", lambda: footer_section(transaction_type, width)),
+    ]
+    return [(name, cached[name] if name in cached else build()) for name, build in builders]
+
+
+# Documents whose static sections are kept for regeneration
+LAYOUT_CACHE_DOCUMENTS = 32
+
+# Sections that stay the same when a document is regenerated with a new description
+STATIC_SECTIONS = ("header", "company", "footer")
+
+
+class LayoutCache:
+    """
+    Static sections of recently rendered documents, kept for regeneration
+
+    Entries are keyed by document number and hold the header, the company
+    block and the footer with the bank details.
+    A regenerated document reuses them and only builds the sections that
+    depend on the entity, description and amount. An entry is dropped when
+    any input of its static sections changes.
+
+    Each entry has its own lock: ReportLab lays flowables out in place, so a
+    cached section must not be in two builds at once.
+
+    Args:
+        max_documents (int, optional): Documents kept, least recently used dropped first
+    """
+
+    def __init__(self, max_documents=LAYOUT_CACHE_DOCUMENTS):
+        self.max_documents = max_documents
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def checkout(self, invoice_number, signature):
+        """
+        Hold a document's cached sections for the duration of a build
+
+        Args:
+            invoice_number (str): Document number
+            signature (tuple): Every input of the static sections
+
+        Yields:
+            dict: Section name -> flowables; empty on a miss. Sections added
+            to it are kept for the next build of the document.
+        """
+        with self._lock:
+            entry = self._entries.get(invoice_number)
+            if entry is None or entry["signature"] != signature:
+                entry = {"signature": signature, "sections": {}, "lock": threading.Lock()}
+                self._entries[invoice_number] = entry
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._entries.move_to_end(invoice_number)
+            while len(self._entries) > self.max_documents:
+                self._entries.popitem(last=False)
+
+        with entry["lock"]:
+            yield entry["sections"]
+
+    def stats(self):
+        with self._lock:
+            return {"documents": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_layout_cache = None
+_layout_cache_lock = threading.Lock()
+
+
+def get_layout_cache():
+    """
+    Return the process-wide layout cache
+    """
+    global _layout_cache
+    if _layout_cache is None:
+        with _layout_cache_lock:
+            if _layout_cache is None:
+                _layout_cache = LayoutCache()
+    return _layout_cache
+
+
+def render_pdf(
+    document_type, transaction_type, entity_name, entity_type, 
+    amount, date, payment_method, description, notes, invoice_number,
+    company_name, company_address, company_email, company_phone,
+    company_website, company_number, company_vat, currency="GBP", reuse_layout=False,
+    profile="standard"
+):
+    """
+    Render a PDF invoice or receipt in memory
+
+    Nothing is written to disk, so this is safe to call from several threads
+    at once.
+
+    Args:
+        reuse_layout (bool, optional): Keep the static sections in the layout
+            cache and reuse them when the same document number is rendered
+            again, e.g. regenerated with a new description
+        profile (str, optional): Key of PDF_PROFILES
+
+    Returns:
+        bytes: The PDF document
+    """
+    # Create a buffer for the PDF
+    buffer = io.BytesIO()
+    doc = new_document(buffer)
+
+    if reuse_layout:
+        signature = (
+            TEMPLATE_VERSION, document_type, transaction_type, date, company_name, company_address,
+            company_email, company_phone, company_website, company_number, company_vat, doc.width,
+            logo_signature(), profile
+        )
+        layout = get_layout_cache().checkout(invoice_number, signature)
+    else:
+        layout = contextlib.nullcontext({})
+
+    with layout as cached:
+        # Container for the 'Flowable' objects
+        elements = []
+        with tracing.span("pdf.sections", invoice_number=invoice_number, reused=len(cached)):
+            for name, flowables in document_sections(
+                document_type, transaction_type, entity_name, entity_type,
+                amount, date, payment_method, description, notes, invoice_number,
+                company_name, company_address, company_email, company_phone,
+                company_website, company_number, company_vat, currency, doc.width, cached, profile
+            ):
+                elements.extend(flowables)
+                if reuse_layout and name in STATIC_SECTIONS:
+                    cached[name] = flowables
+
+        # Build the PDF
+        with tracing.span("pdf.build", invoice_number=invoice_number):
+            try:
+                doc.build(elements, canvasmaker=profile_canvas(profile))
+            finally:
+                # Platypus marks flowables it had to push to the next page and
+                # never clears the mark; a cached one would fail its next build
+                for flowables in cached.values():
+                    for flowable in flowables:
+                        flowable.__dict__.pop("_postponed", None)
     
     # Get the value of the BytesIO buffer
     pdf_data = buffer.getvalue()
     buffer.close()
     
-    # Save to file
-    with open(filename, 'wb') as f:
-        f.write(pdf_data)
+    return pdf_data
+
+
+def statement_summary_section(transactions, width):
+    """
+    One row per transaction plus a net grand total per currency
+
+    Expenses are shown as negative amounts so the grand total is the net.
+    """
+    template = get_invoice_template()
+    styles = template.styles
+    
+    summary_data = [["Date", "Number", "Description", "Type", "Amount"]]
+    totals = {}
+    for transaction in sorted(transactions, key=lambda t: (t["date"], t["invoice_number"])):
+        signed_amount = transaction["amount"] if transaction["transaction_type"] == "Income" else -transaction["amount"]
+        totals[transaction["currency"]] = totals.get(transaction["currency"], 0.0) + signed_amount
+        summary_data.append([
+            transaction["date"].strftime('%d/%m/%Y'),
+            transaction["invoice_number"],
+            Paragraph(transaction["description"], styles['BasicText']),
+            transaction["transaction_type"],
+            f"{'-' if signed_amount < 0 else ''}{currency_symbol(transaction['currency'])}{abs(signed_amount):.2f}",
+        ])
+    
+    summary_table = Table(
+        summary_data,
+        colWidths=[0.12*width, 0.12*width, 0.48*width, 0.12*width, 0.16*width],
+        repeatRows=1
+    )
+    summary_table.setStyle(template.summary_table_style)
     
-    return filename
+    elements = [
+        Paragraph("SUMMARY", styles['SectionHeading']),
+        Spacer(1, 0.1*inch),
+        summary_table,
+        Spacer(1, 0.1*inch),
+    ]
+    for currency, total in sorted(totals.items()):
+        label = "Grand Total" if len(totals) == 1 else f"Grand Total ({currency})"
+        elements.extend(total_section(total, currency, width, label=label))
+    return elements
+
+
+def render_statement_pdf(
+    transactions, statement_number, statement_date,
+    company_name, company_address, company_email, company_phone,
+    company_website, company_number, company_vat, include_details=True, profile="standard"
+):
+    """
+    Render many transactions into a single multi-page PDF
+
+    The first page carries a summary table and grand total, followed by a
+    detail page per transaction. Fonts, the logo image and the bank details
+    block are included once for the whole statement.
+
+    Args:
+        transactions (list): dicts with the transaction arguments of render_pdf
+            (document_type, transaction_type, entity_name, entity_type, amount,
+            date, payment_method, description, notes, invoice_number, currency)
+        statement_number (str): Number printed on the summary page
+        statement_date (date): Date printed on the summary page
+        include_details (bool, optional): Add a detail page per transaction
+        profile (str, optional): Key of PDF_PROFILES
+
+    Returns:
+        bytes: The PDF document
+    """
+    buffer = io.BytesIO()
+    doc = new_document(buffer)
+    width = doc.width
+    
+    elements = []
+    elements.extend(header_section("Statement", width, profile))
+    elements.extend(company_section(
+        statement_number, statement_date, company_name, company_address, company_email,
+        company_phone, company_website, company_number, company_vat, width
+    ))
+    
+    # Name the entity on the summary page when the statement covers just one
+    has_income = any(t["transaction_type"] == "Income" for t in transactions)
+    entities = {(t["entity_name"], t["entity_type"]) for t in transactions}
+    if len(entities) == 1:
+        entity_name, entity_type = entities.pop()
+        elements.extend(entity_section("Income" if has_income else "Expense", entity_name, entity_type, width))
+    
+    elements.extend(statement_summary_section(transactions, width))
+    
+    elements.extend(footer_section("Income" if has_income else "Expense", width))
+    
+    if include_details:
+        for transaction in sorted(transactions, key=lambda t: (t["date"], t["invoice_number"])):
+            elements.append(PageBreak())
+            elements.extend(header_section(transaction["document_type"], width, profile))
+            elements.extend(company_section(
+                transaction["invoice_number"], transaction["date"], company_name, company_address,
+                company_email, company_phone, company_website, company_number, company_vat, width
+            ))
+            elements.extend(entity_section(
+                transaction["transaction_type"], transaction["entity_name"], transaction["entity_type"], width
+            ))
+            elements.extend(transaction_section(
+                transaction["description"], transaction["amount"], transaction.get("notes"), width
+            ))
+            elements.extend(payment_section(
+                transaction["payment_method"], transaction["transaction_type"], transaction["date"], width
+            ))
+            elements.extend(total_section(transaction["amount"], transaction["currency"], width))
+    
+    with tracing.span("pdf.build_statement", statement_number=statement_number, transactions=len(transactions)):
+        doc.build(elements, canvasmaker=profile_canvas(profile))
+    pdf_data = buffer.getvalue()
+    buffer.close()
+    
+    return pdf_data
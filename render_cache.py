@@ -0,0 +1,178 @@
+"""
+Disk-backed, content-addressed cache of rendered PDFs and JPGs
+
+Entries are keyed by a hash of every generate_pdf input plus the template
+version, so an identical request is served from disk without rebuilding the
+PDF or rasterizing it again. The least recently used entries are evicted
+once the cache grows past its byte budget.
+"""
+import datetime
+import hashlib
+import json
+import os
+import threading
+
+from pdf_generator import TEMPLATE_VERSION, logo_signature
+from utils import atomic_write
+
+# Directory holding cached artifacts
+CACHE_DIR = "data/render_cache"
+
+# Total size the cache may grow to before evicting
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot hash {type(value).__name__}")
+
+
+def cache_key(fields, variant=""):
+    """
+    Hash the render inputs into a cache key
+
+    The key also covers the template version and the current logo file, so
+    changing either stops old renders from being served.
+
+    Args:
+        fields (dict): The keyword arguments passed to render_pdf
+        variant (str, optional): Distinguishes derived artifacts, e.g. a raster profile
+
+    Returns:
+        str: Hex digest
+    """
+    payload = json.dumps(
+        {
+            "template_version": TEMPLATE_VERSION,
+            "logo": logo_signature(),
+            "fields": fields,
+            "variant": variant,
+        },
+        sort_keys=True,
+        default=_json_default
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    Size-bounded LRU cache of artifact bytes stored as files
+
+    Recency is tracked through file modification times, so the LRU order is
+    shared by every process using the same directory.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _path(self, key, extension):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{extension}")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.startswith(".tmp_"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def get(self, key, extension):
+        """
+        Fetch cached bytes and mark the entry as recently used
+
+        Returns:
+            bytes or None: The cached artifact, or None on a miss
+        """
+        path = self._path(key, extension)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, extension, data):
+        """
+        Store bytes under key, evicting old entries if over budget
+        """
+        path = self._path(key, extension)
+        existed = os.path.exists(path)
+        atomic_write(path, data)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            elif not existed:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Called with the lock held; drop least recently used files down to 90% of the budget
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        size = sum(entry[1] for entry in entries)
+        target = self.max_bytes * 0.9
+        for path, entry_size, _ in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            self.evictions += 1
+        self._size = size
+
+    def stats(self):
+        """
+        Hit/miss counters for this process and the cache size on disk
+
+        Returns:
+            dict: hits, misses, hit_rate, evictions, bytes and max_bytes
+        """
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache():
+    """
+    Get the process-wide RenderCache
+
+    Returns:
+        RenderCache: The shared cache
+    """
+    global _render_cache
+    if _render_cache is None:
+        with _render_cache_lock:
+            if _render_cache is None:
+                _render_cache = RenderCache()
+    return _render_cache
@@ -0,0 +1,159 @@
+"""
+Bounded background worker pool for document rendering
+
+Jobs are identified by an ID so a UI can submit work, return immediately and
+poll for the result later.
+"""
+import collections
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class RenderQueue:
+    """
+    Thread pool with admission control, job IDs and latency statistics
+
+    Args:
+        max_workers (int): Jobs rendered at the same time
+        max_pending (int): Jobs allowed to be queued or running before
+            submit raises QueueFullError
+        history (int): Finished jobs kept for status lookups
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, history=100):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="render")
+        self._lock = threading.Lock()
+        self._jobs = collections.OrderedDict()
+        self._history = history
+        self._latencies = collections.deque(maxlen=history)
+        self._completed = 0
+        self._failed = 0
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) for background execution
+
+        Returns:
+            str: The job ID
+
+        Raises:
+            QueueFullError: If max_pending jobs are already queued or running
+        """
+        with self._lock:
+            if self._pending_count() >= self.max_pending:
+                raise QueueFullError(f"Render queue is full ({self.max_pending} jobs pending)")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "state": QUEUED,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["state"] = RUNNING
+            job["started_at"] = time.time()
+        tracing.observe("queue.wait", job["started_at"] - job["submitted_at"], job_id=job_id)
+        try:
+            result, error, state = func(*args, **kwargs), None, DONE
+        except Exception as e:
+            result, error, state = None, str(e), FAILED
+        with self._lock:
+            job.update({"state": state, "result": result, "error": error, "finished_at": time.time()})
+            self._latencies.append(job["finished_at"] - job["submitted_at"])
+            if state == DONE:
+                self._completed += 1
+            else:
+                self._failed += 1
+            self._prune()
+
+    def _pending_count(self):
+        return sum(1 for job in self._jobs.values() if job["state"] in (QUEUED, RUNNING))
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["state"] in (DONE, FAILED)]
+        for job_id in finished[:max(0, len(finished) - self._history)]:
+            del self._jobs[job_id]
+
+    def status(self, job_id):
+        """
+        Look up a job
+
+        Returns:
+            dict or None: A copy of the job record with its queue/run latency,
+            or None if the ID is unknown or has aged out of the history
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+
+        now = time.time()
+        job["wait_seconds"] = (job["started_at"] or now) - job["submitted_at"]
+        job["total_seconds"] = (job["finished_at"] or now) - job["submitted_at"]
+        if job["state"] == QUEUED:
+            with self._lock:
+                job["position"] = [j for j in self._jobs if self._jobs[j]["state"] == QUEUED].index(job_id) + 1
+        return job
+
+    def discard(self, job_id):
+        """
+        Drop a finished job and its result once the caller has collected it
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["state"] in (DONE, FAILED):
+                del self._jobs[job_id]
+
+    def stats(self):
+        """
+        Queue depth and latency summary
+
+        Returns:
+            dict: queued, running, completed and failed counts plus p50/p95
+            end-to-end latency in seconds over recent jobs
+        """
+        with self._lock:
+            states = collections.Counter(job["state"] for job in self._jobs.values())
+            latencies = sorted(self._latencies)
+            completed, failed = self._completed, self._failed
+
+        p50 = statistics.median(latencies) if latencies else None
+        p95 = latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))] if latencies else None
+        return {
+            "queued": states[QUEUED],
+            "running": states[RUNNING],
+            "completed": completed,
+            "failed": failed,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "p50_seconds": p50,
+            "p95_seconds": p95,
+        }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
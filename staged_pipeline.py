@@ -0,0 +1,128 @@
+"""
+Multi-stage worker pipeline with bounded queues between stages
+
+Each stage has its own pool of worker threads and an inbox of limited size,
+so a slow stage applies backpressure to the stages before it instead of
+letting work pile up in memory. Stages that do their work in a subprocess
+or a process pool (pdftoppm, ReportLab builds) overlap with each other
+because their threads spend that time waiting, not holding the GIL.
+"""
+import queue
+import threading
+import time
+
+# Marks the end of the input for a worker
+_STOP = object()
+
+
+class Stage:
+    """
+    One step of a pipeline
+
+    Args:
+        name (str): Stage name used in the statistics
+        func (callable): Called with each job dict; it updates the job in place.
+            Exceptions are stored on the job as "error" and later stages skip it,
+            except stages created with always=True.
+        workers (int, optional): Threads running func. Defaults to 1.
+        always (bool, optional): Also run for jobs that failed earlier, e.g. to
+            write a result record
+    """
+
+    def __init__(self, name, func, workers=1, always=False):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.always = always
+        self.busy_seconds = 0.0
+        self.processed = 0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def _observe(self, seconds, depth):
+        with self._lock:
+            self.busy_seconds += seconds
+            self.processed += 1
+            self.max_depth = max(self.max_depth, depth)
+
+
+def run_pipeline(jobs, stages, queue_size=8):
+    """
+    Push every job through the stages in order
+
+    Args:
+        jobs (iterable): Job dicts; consumed lazily, so it may be a generator
+        stages (list): Stage objects, first to last
+        queue_size (int, optional): Capacity of each stage's inbox
+
+    Returns:
+        dict: elapsed seconds, job count and per-stage statistics
+            (workers, processed, busy seconds, utilization and peak queue depth)
+    """
+    inboxes = [queue.Queue(maxsize=queue_size) for _ in stages]
+    remaining = [stage.workers for stage in stages]
+    remaining_lock = threading.Lock()
+
+    def worker(index):
+        stage, inbox = stages[index], inboxes[index]
+        outbox = inboxes[index + 1] if index + 1 < len(stages) else None
+        while True:
+            job = inbox.get()
+            if job is _STOP:
+                break
+            if stage.always or "error" not in job:
+                depth = inbox.qsize()
+                started = time.perf_counter()
+                try:
+                    stage.func(job)
+                except Exception as e:
+                    job["error"] = f"{stage.name}: {e}"
+                stage._observe(time.perf_counter() - started, depth)
+            if outbox is not None:
+                outbox.put(job)
+
+        # The last worker of a stage to finish stops the next stage
+        with remaining_lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last and outbox is not None:
+            for _ in range(stages[index + 1].workers):
+                outbox.put(_STOP)
+
+    threads = [
+        threading.Thread(target=worker, args=(index,), name=f"{stage.name}_{number}", daemon=True)
+        for index, stage in enumerate(stages)
+        for number in range(stage.workers)
+    ]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    count = 0
+    try:
+        for job in jobs:
+            inboxes[0].put(job)
+            count += 1
+    finally:
+        for _ in range(stages[0].workers):
+            inboxes[0].put(_STOP)
+
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "seconds": elapsed,
+        "jobs": count,
+        "stages": {
+            stage.name: {
+                "workers": stage.workers,
+                "processed": stage.processed,
+                "busy_seconds": round(stage.busy_seconds, 3),
+                "utilization": round(stage.busy_seconds / (stage.workers * elapsed), 3) if elapsed else 0.0,
+                "max_queue_depth": stage.max_depth,
+            }
+            for stage in stages
+        },
+    }
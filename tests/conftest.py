@@ -0,0 +1,13 @@
+import pytest
+
+import number_index
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Run a test in an empty directory, so data/ files start out missing
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(number_index, "_index", None)
+    return tmp_path
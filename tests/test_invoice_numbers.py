@@ -0,0 +1,67 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import invoice_generator
+from invoice_generator import (
+    claim_invoice_numbers, force_invoice_number, get_current_counter, parse_invoice_number,
+    reserve_invoice_numbers
+)
+from number_index import get_number_index
+
+
+def _reserve_blocks(blocks):
+    return [number for _ in range(blocks) for number in reserve_invoice_numbers("Invoice", 3)]
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs the fork start method")
+def test_reservations_from_several_processes_never_overlap(workdir):
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=4, mp_context=context) as pool:
+        results = list(pool.map(_reserve_blocks, [25] * 4))
+
+    numbers = [number for result in results for number in result]
+    assert len(numbers) == 300
+    assert sorted(numbers) == [f"INV{n:03d}" for n in range(1, 301)]
+    assert get_current_counter("Invoice") == 300
+    assert invoice_generator.audit_invoice_numbers()["Invoice"]["duplicates"] == {}
+
+
+def test_reservation_skips_numbers_already_issued(workdir):
+    with invoice_generator._locked_counters():
+        get_number_index().mark([3, 5], "Invoice")
+
+    assert reserve_invoice_numbers("Invoice", 4) == ["INV001", "INV002", "INV004", "INV006"]
+
+
+def test_forced_number_above_the_counter_is_not_reserved_again(workdir):
+    reserve_invoice_numbers("Invoice", 2)
+    force_invoice_number(20, "Invoice")
+
+    assert reserve_invoice_numbers("Invoice", 1) == ["INV021"]
+
+
+def test_claim_refuses_issued_numbers_and_records_the_rest(workdir):
+    reserve_invoice_numbers("Receipt", 2)
+
+    assert claim_invoice_numbers([2, 10], "Receipt") == [2]
+    assert get_number_index().contains(10, "Receipt")
+    assert reserve_invoice_numbers("Receipt", 1) == ["REC011"]
+
+
+@pytest.mark.parametrize("text, document_type", [
+    ("INV", "Invoice"),
+    ("REC001", "Invoice"),
+    ("INV001", "Receipt"),
+    ("/../../tmp/INV001", "Invoice"),
+    ("INV001/x", "Invoice"),
+])
+def test_parse_invoice_number_rejects_malformed_numbers(text, document_type):
+    with pytest.raises(ValueError):
+        parse_invoice_number(text, document_type)
+
+
+def test_parse_invoice_number():
+    assert parse_invoice_number("INV007", "Invoice") == 7
+    assert parse_invoice_number("REC1234", "Receipt") == 1234
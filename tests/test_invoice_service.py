@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+import pytest
+
+from invoice_service import InvoiceService
+from utils import join_inside
+
+
+def _post(service, payload):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(payload).encode("utf-8"), "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/documents", "headers": []}
+    asyncio.run(service(scope, receive, send))
+    return messages[0]["status"], json.loads(messages[1]["body"])
+
+
+@pytest.fixture
+def service(workdir):
+    service = InvoiceService(output_dir=str(workdir / "out"), workers=1, with_jpg=False)
+    yield service
+    service.close()
+
+
+@pytest.mark.parametrize("invoice_number", ["/../../../../tmp/rv/EVIL", "INV001"])
+def test_client_supplied_numbers_are_refused(service, workdir, invoice_number):
+    status, body = _post(service, {"entity_name": "x", "amount": 1, "invoice_number": invoice_number})
+
+    assert status == 400
+    assert "invoice_number" in body["error"]
+    assert service.queue.stats()["queued"] == 0
+    assert not (workdir / "out").exists()
+
+
+def test_join_inside_refuses_paths_that_leave_the_directory(workdir):
+    assert join_inside("out", "invoice_INV001_20250101.pdf") == "out/invoice_INV001_20250101.pdf"
+    with pytest.raises(ValueError):
+        join_inside("out", "invoice_/../../../../tmp/rv/EVIL_20250101.pdf")
+    with pytest.raises(ValueError):
+        join_inside("out", "/tmp/EVIL.pdf")
@@ -0,0 +1,65 @@
+import json
+
+from number_index import IssuedNumberIndex
+
+
+def test_seed_marks_numbers_up_to_each_counter(workdir):
+    index = IssuedNumberIndex("issued.json")
+    index.seed({"Invoice": 3, "Receipt": 1, "Statement": 7})
+
+    assert [index.contains(n, "Invoice") for n in range(1, 5)] == [True, True, True, False]
+    assert index.contains(1, "Receipt")
+    assert index.next_free("Invoice") == 4
+    assert index.next_free("Receipt") == 2
+    # The statement counter shares the counter file but is not an invoice series
+    assert sorted(index.audit()) == ["Invoice", "Receipt"]
+
+
+def test_seed_keeps_an_existing_index(workdir):
+    index = IssuedNumberIndex("issued.json")
+    index.seed({"Invoice": 2})
+    index.seed({"Invoice": 10})
+
+    assert index.next_free("Invoice") == 3
+
+
+def test_next_free_skips_issued_numbers(workdir):
+    index = IssuedNumberIndex("issued.json")
+    index.mark([1, 2, 3, 5], "Invoice")
+
+    assert index.next_free("Invoice") == 4
+    assert index.next_free("Invoice", 5) == 6
+    assert index.audit()["Invoice"]["gaps"] == [4]
+
+
+def test_next_free_across_full_bytes(workdir):
+    index = IssuedNumberIndex("issued.json")
+    index.mark(range(1, 40), "Invoice")
+
+    assert index.next_free("Invoice") == 40
+    assert index.next_free("Invoice", 17) == 40
+
+
+def test_mark_reports_duplicates(workdir):
+    index = IssuedNumberIndex("issued.json")
+    assert index.mark([4, 5], "Invoice") == []
+    assert index.mark([5], "Invoice") == [5]
+    assert index.audit()["Invoice"]["duplicates"] == {5: 1}
+
+
+def test_index_is_reloaded_by_another_instance(workdir):
+    IssuedNumberIndex("issued.json").mark([7], "Receipt")
+
+    assert IssuedNumberIndex("issued.json").contains(7, "Receipt")
+
+
+def test_empty_or_damaged_bitmaps_load_as_empty(workdir):
+    (workdir / "issued.json").write_text(json.dumps({
+        "Invoice": {"bitmap": ""},
+        "Receipt": {"bitmap": "not base64!"},
+    }))
+    index = IssuedNumberIndex("issued.json")
+
+    assert not index.contains(1, "Invoice")
+    assert index.next_free("Invoice") == 1
+    assert index.next_free("Receipt") == 1
@@ -0,0 +1,227 @@
+"""
+Lightweight timing spans for the document generation stages
+
+Tracing is off unless INVOICE_TRACE=1 is set or enable() is called. While
+off, span() returns a shared no-op context manager, so instrumented code
+pays for one function call and a flag check.
+
+While on, every span updates a per-stage latency histogram and a rolling
+window of recent durations. If a JSON-lines file is configured, the span is
+also appended there. The histograms can be exported as a Prometheus text
+snapshot.
+"""
+import bisect
+import collections
+import json
+import os
+import statistics
+import threading
+import time
+
+# Environment variables that switch tracing on at import time
+TRACE_ENV = "INVOICE_TRACE"
+TRACE_FILE_ENV = "INVOICE_TRACE_FILE"
+
+# JSON-lines file used when tracing is enabled from the environment
+DEFAULT_TRACE_FILE = "data/traces.jsonl"
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Durations kept per stage for the rolling percentiles
+WINDOW = 500
+
+_enabled = False
+_trace_file = None
+_lock = threading.Lock()
+_stages = {}
+
+
+class _StageStats:
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.recent = collections.deque(maxlen=WINDOW)
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _record(self.name, seconds, self.wall_start, self.attributes, error=exc_type is not None)
+        return False
+
+    def set(self, **attributes):
+        """
+        Attach extra attributes (e.g. sizes or cache hits) to the span
+        """
+        self.attributes.update(attributes)
+
+
+def span(name, **attributes):
+    """
+    Time a stage
+
+    Usage:
+        with tracing.span("pdf.build", invoice_number=number):
+            doc.build(elements)
+
+    Args:
+        name (str): Stage name
+        **attributes: Extra fields written to the JSON-lines export
+
+    Returns:
+        A context manager; a shared no-op one when tracing is disabled
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, attributes)
+
+
+def observe(name, seconds, **attributes):
+    """
+    Record a duration measured elsewhere, such as time spent waiting in a queue
+
+    Args:
+        name (str): Stage name
+        seconds (float): Duration
+        **attributes: Extra fields written to the JSON-lines export
+    """
+    if _enabled:
+        _record(name, seconds, time.time() - seconds, attributes, error=False)
+
+
+def _record(name, seconds, wall_start, attributes, error):
+    with _lock:
+        stats = _stages.get(name)
+        if stats is None:
+            stats = _stages[name] = _StageStats()
+        stats.observe(seconds)
+        if _trace_file:
+            line = json.dumps({
+                "stage": name,
+                "start": round(wall_start, 6),
+                "seconds": round(seconds, 6),
+                "thread": threading.current_thread().name,
+                "error": error,
+                **attributes,
+            }, default=str)
+            with open(_trace_file, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def enable(trace_file=None):
+    """
+    Turn tracing on
+
+    Args:
+        trace_file (str, optional): Append every span to this JSON-lines file
+    """
+    global _enabled, _trace_file
+    if trace_file:
+        os.makedirs(os.path.dirname(trace_file) or ".", exist_ok=True)
+    _trace_file = trace_file
+    _enabled = True
+
+
+def disable():
+    """
+    Turn tracing off; collected statistics are kept
+    """
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """
+    Forget all collected statistics
+    """
+    with _lock:
+        _stages.clear()
+
+
+def summary():
+    """
+    Per-stage statistics for a diagnostics view
+
+    Returns:
+        dict: stage -> count, total_seconds, p50/p95/max seconds over the
+        rolling window and cumulative histogram buckets as (upper bound, count)
+    """
+    with _lock:
+        snapshot = {name: (stats.count, stats.total, list(stats.recent), list(stats.bucket_counts))
+                    for name, stats in _stages.items()}
+
+    result = {}
+    for name, (count, total, recent, bucket_counts) in sorted(snapshot.items()):
+        ordered = sorted(recent)
+        cumulative, buckets = 0, []
+        for bound, bucket_count in zip(BUCKETS + (float("inf"),), bucket_counts):
+            cumulative += bucket_count
+            buckets.append((bound, cumulative))
+        result[name] = {
+            "count": count,
+            "total_seconds": total,
+            "p50_seconds": statistics.median(ordered) if ordered else None,
+            "p95_seconds": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))] if ordered else None,
+            "max_seconds": ordered[-1] if ordered else None,
+            "buckets": buckets,
+        }
+    return result
+
+
+def prometheus_snapshot():
+    """
+    Render the stage histograms in the Prometheus text exposition format
+
+    Returns:
+        str: The metrics text
+    """
+    lines = [
+        "# HELP invoice_stage_duration_seconds Time spent in each document generation stage",
+        "# TYPE invoice_stage_duration_seconds histogram",
+    ]
+    for name, stats in summary().items():
+        for bound, cumulative in stats["buckets"]:
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'invoice_stage_duration_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'invoice_stage_duration_seconds_sum{{stage="{name}"}} {stats["total_seconds"]:.6f}')
+        lines.append(f'invoice_stage_duration_seconds_count{{stage="{name}"}} {stats["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+if os.environ.get(TRACE_ENV, "").lower() in ("1", "true", "yes"):
+    enable(os.environ.get(TRACE_FILE_ENV, DEFAULT_TRACE_FILE))
@@ -1,5 +1,6 @@
 import os
 import shutil
+import tempfile
 
 def save_file(path, filename):
     """
@@ -24,3 +25,54 @@ def save_file(path, filename):
     except Exception as e:
         print(f"Error saving file: {e}")
         return False
+
+
+def join_inside(directory, filename):
+    """
+    Join a generated filename onto a directory, refusing names that leave it
+
+    Document numbers end up in filenames, so a number such as
+    "/../../etc/x" must not be able to place a file elsewhere.
+
+    Args:
+        directory (str): Directory the file must stay in ("" for the working directory)
+        filename (str): Filename, possibly built from user input
+
+    Returns:
+        str: os.path.join(directory, filename)
+
+    Raises:
+        ValueError: If the joined path resolves outside directory
+    """
+    path = os.path.join(directory, filename)
+    root = os.path.realpath(directory)
+    if os.path.commonpath([root, os.path.realpath(path)]) != root:
+        raise ValueError(f"Filename {filename!r} resolves outside {directory or '.'!r}")
+    return path
+
+
+def atomic_write(path, data):
+    """
+    Write bytes to a file so readers never see a partially written file
+
+    The data goes to a temporary file in the same directory which is then
+    renamed over the destination.
+
+    Args:
+        path (str): Destination path
+        data (bytes): File contents
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp creates private files; artifacts should be readable like any other output
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise